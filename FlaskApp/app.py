@@ -5,27 +5,36 @@ import logging
 import json
 import threading
 import time
-import queue
-import cv2
 import re
-import datetime
 import shutil
 
 # from config import *
-from modules.image_processor import extract_metadata, preprocess_and_extract_line, extract_laser_points, crop_images
-from modules.esp32_controller import esp32_laser_on, esp32_laser_off, esp32_step_motor, esp32_check_status
+from modules.image_processor import crop_images
+from modules.esp32_controller import esp32_laser_on, esp32_laser_off, esp32_step, esp32_step_motor, esp32_check_status, controller as esp32_controller
 from modules.utils import generate_qr_code
-from modules.storage import get_all_scans, create_scan_directory, delete_scan 
-from modules.point_cloud import convert_to_3d, save_ply
-from config import SECRET_KEY, HOST, PORT, DEBUG, ESP32_IP, TIME_DELAY, TOTAL_STEPS, IMAGES_FOLDER 
+from modules.storage import get_all_scans, create_scan_directory, delete_scan, refresh_scan_index_entry, record_image_upload, remove_scan_from_index, latest_scan_id, flush_scan_index
+from modules.uploads import ActiveScan, UploadRequest, UploadFile, set_active_scan, get_active_scan
+from modules.tiles import TILES_DIR, TILE_INDEX_FILE
+from modules.processing import process_scan_images
+from modules.live_reconstruction import LiveReconstructor
+from modules.capture import CaptureHandshake
+from modules.calibration import save_calibration, SCAN_CALIBRATION_FILE
+from modules.metrics import global_metrics, render_prometheus
+from modules.events import EventLogRegistry, TERMINAL_STATUSES, load_summary
+from modules.scheduler import JobScheduler, QueueFullError
+from modules.job_queue import JobQueue
+from config import SECRET_KEY, HOST, PORT, DEBUG, ESP32_IP, TIME_DELAY, TOTAL_STEPS, IMAGES_FOLDER, LASER_THRESHOLD, SUBPIXEL_MODE, PLY_FORMAT, ARTIFACT_LEVEL, LIVE_RECONSTRUCTION, TILE_EXPORT, TILE_MAX_POINTS, TILE_CACHE_SECONDS, CAPTURE_HANDSHAKE, CAPTURE_TIMEOUT, CAPTURE_RETRIES, UPLOAD_FRAME_HANDOFF, CAPTURE_JPEG_QUALITY, CAPTURE_MAX_WIDTH, CAPTURE_MAX_HEIGHT, FRAME_TRANSPORT, FRAME_BATCH_SIZE, FRAME_BATCH_MAX_BYTES, FRAME_MAX_IN_FLIGHT, EVENT_LOG_SIZE, PROGRESS_INTERVAL, MAX_FINISHED_JOBS, JOB_RETENTION_SECONDS, SSE_HEARTBEAT, MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, PROCESSING_BACKEND, JOB_QUEUE_FILE, WORKER_POLL_INTERVAL, WORKER_MAX_ATTEMPTS
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+# Stream /upload-image bodies straight into the active scan's folder
+app.request_class = UploadRequest
 app.config['SECRET_KEY'] = SECRET_KEY
-socketio = SocketIO(app, cors_allowed_origins="*")
+# Frame batches from the phone are larger than Engine.IO's 1 MB default
+socketio = SocketIO(app, cors_allowed_origins="*", max_http_buffer_size=FRAME_BATCH_MAX_BYTES + 1024 * 1024)
 
 # Global variables
 ESP32_IP = ESP32_IP  
@@ -39,33 +48,92 @@ images_captured = 0
 current_mode = "Idle"
 laser_status = False
 TIME_DELAY=TIME_DELAY
+live_reconstructor = None
+capture_handshake = CaptureHandshake()
+capture_requested_at = {}
 
 # Processing status tracking
-processing_status = {}
-processing_results = {}
+processing_jobs = EventLogRegistry(EVENT_LOG_SIZE, PROGRESS_INTERVAL, MAX_FINISHED_JOBS, JOB_RETENTION_SECONDS)
+PROCESSING_SUMMARY_FILE = "processing_status.json"
+processing_scheduler = JobScheduler(MAX_CONCURRENT_JOBS, MAX_QUEUED_JOBS, on_done=lambda job: finish_processing_job(job))
+# With the worker backend, jobs go through a durable queue to `python -m worker` processes
+job_queue = JobQueue(JOB_QUEUE_FILE, WORKER_MAX_ATTEMPTS) if PROCESSING_BACKEND == "worker" else None
 
 # Path for saving images
 IMAGES_FOLDER = IMAGES_FOLDER
 os.makedirs(IMAGES_FOLDER, exist_ok=True)
 
 # Scanning Process
+def capture_frame(step, mode):
+    """Request a frame from the phone; returns False if it was dropped"""
+    if not CAPTURE_HANDSHAKE:
+        # Wait briefly for image capture
+        time.sleep(TIME_DELAY)
+        capture_requested_at[step] = time.perf_counter()
+        socketio.emit('capture_request', {
+            'step': step,
+            'mode': mode
+        })
+        # Small delay between steps
+        time.sleep(TIME_DELAY)
+        return True
+    
+    capture_handshake.expect(step)
+    try:
+        for attempt in range(CAPTURE_RETRIES + 1):
+            capture_requested_at[step] = time.perf_counter()
+            socketio.emit('capture_request', {
+                'step': step,
+                'mode': mode
+            })
+            if capture_handshake.wait(step, CAPTURE_TIMEOUT):
+                return True
+            if not scanning:
+                return False
+            socketio.emit('log_message', {'message': f"No frame for step {step} after {CAPTURE_TIMEOUT}s (attempt {attempt + 1}/{CAPTURE_RETRIES + 1})"})
+        return False
+    finally:
+        capture_handshake.done(step)
+
+def advance_turntable(step, failed_steps):
+    """Step the turntable after a frame, retrying once; returns False if it did not move"""
+    if esp32_step() is not None:
+        return True
+    # The device may have moved before the error, so the step is reported even if the retry succeeds
+    failed_steps.append(step)
+    socketio.emit('log_message', {'message': f"Turntable step after frame {step} failed, retrying"})
+    return esp32_step() is not None
+
 def start_scan():
-    global scanning, current_step, total_steps, images_captured, current_mode, scan_thread
+    global scanning, current_step, total_steps, images_captured, current_mode, scan_thread, live_reconstructor
     
     scanning = True
     current_step = 0
     total_steps = 400
     images_captured = 0
+    dropped_frames = []
+    failed_steps = []
+    step_error = None
+    capture_requested_at.clear()
     
-    # Create a new directory for this scan
+    # Create a new directory for this scan and route uploads to it
     scan_dir = create_scan_directory()
+    active_scan = ActiveScan(scan_dir, UPLOAD_FRAME_HANDOFF)
+    set_active_scan(active_scan)
+    
+    # Reconstruct pairs as their frames arrive instead of after the scan
+    if LIVE_RECONSTRUCTION:
+        live_reconstructor = LiveReconstructor(scan_dir, socketio.emit, LASER_THRESHOLD, SUBPIXEL_MODE,
+                                               ARTIFACT_LEVEL, PLY_FORMAT, TILE_MAX_POINTS if TILE_EXPORT else None)
+        active_scan.add_consumer(live_reconstructor)
     
     try:
         # First 200 steps with laser ON
         current_mode = "Laser ON"
         esp32_laser_on()
         laser_status = True
-        esp32_step_motor()
+        if not CAPTURE_HANDSHAKE:
+            esp32_step_motor()
         
         for i in range(200):
             if not scanning:
@@ -73,17 +141,17 @@ def start_scan():
             
             current_step = i + 1
             
-            # Wait briefly for image capture
-            time.sleep(TIME_DELAY)
-
             # Capture image via WebSocket
-            socketio.emit('capture_request', {
-                'step': current_step,
-                'mode': 'laser_on'
-            })
-        
+            if capture_frame(current_step, 'laser_on'):
+                images_captured += 1
+            else:
+                dropped_frames.append(current_step)
             
-            images_captured += 1
+            # Closed loop: advance one step only after the frame landed or was dropped,
+            # so every later frame is still saved at the index of its turntable angle
+            if CAPTURE_HANDSHAKE and not advance_turntable(current_step, failed_steps):
+                step_error = f"Turntable did not step after frame {current_step}, later frames would be misaligned"
+                break
             
             # Update progress
             progress = (current_step / total_steps) * 100
@@ -94,16 +162,14 @@ def start_scan():
                 'images': images_captured,
                 'mode': current_mode
             })
-            
-            # Small delay between steps
-            time.sleep(TIME_DELAY)
         
         # Next 200 steps with laser OFF
-        if scanning:
+        if scanning and step_error is None:
             current_mode = "Laser OFF"
             esp32_laser_off()
             laser_status = True
-            esp32_step_motor()
+            if not CAPTURE_HANDSHAKE:
+                esp32_step_motor()
             
             for i in range(200):
                 if not scanning:
@@ -111,17 +177,17 @@ def start_scan():
                 
                 current_step = i + 201
                 
-                # Wait briefly for image capture
-                time.sleep(TIME_DELAY)
-
                 # Capture image via WebSocket
-                socketio.emit('capture_request', {
-                    'step': current_step,
-                    'mode': 'laser_off'
-                })
+                if capture_frame(current_step, 'laser_off'):
+                    images_captured += 1
+                else:
+                    dropped_frames.append(current_step)
                 
-                
-                images_captured += 1
+                # Closed loop: advance one step only after the frame landed or was dropped,
+                # so every later frame is still saved at the index of its turntable angle
+                if CAPTURE_HANDSHAKE and not advance_turntable(current_step, failed_steps):
+                    step_error = f"Turntable did not step after frame {current_step}, later frames would be misaligned"
+                    break
                 
                 # Update progress
                 progress = (current_step / total_steps) * 100
@@ -132,14 +198,20 @@ def start_scan():
                     'images': images_captured,
                     'mode': current_mode
                 })
-                
-                # Small delay between steps
-                time.sleep(TIME_DELAY)
         
         # Scan completed
-        if scanning:
+        if step_error is not None:
+            socketio.emit('log_message', {'message': f"Scan aborted: {step_error}"})
+            socketio.emit('scan_error', {'message': step_error, 'images_captured': images_captured,
+                                         'dropped_frames': dropped_frames, 'failed_steps': failed_steps})
+        elif scanning:
             socketio.emit('log_message', {'message': "Scan completed successfully!"})
-            socketio.emit('scan_completed', {'images_captured': images_captured})
+            if dropped_frames:
+                socketio.emit('log_message', {'message': f"Dropped {len(dropped_frames)} frames at steps: {', '.join(map(str, dropped_frames))}"})
+            if failed_steps:
+                socketio.emit('log_message', {'message': f"Turntable steps retried after frames: {', '.join(map(str, failed_steps))}"})
+            socketio.emit('scan_completed', {'images_captured': images_captured, 'dropped_frames': dropped_frames,
+                                             'failed_steps': failed_steps})
         else:
             socketio.emit('log_message', {'message': "Scan was stopped manually"})
             socketio.emit('scan_stopped', {})
@@ -155,145 +227,134 @@ def start_scan():
         current_mode = "Idle"
         socketio.emit('update_mode', {'mode': current_mode})
         socketio.emit('scan_stopped', {})
+        # Finish the live reconstruction with the frames that made it
+        if live_reconstructor is not None:
+            reconstructor, live_reconstructor = live_reconstructor, None
+            active_scan.remove_consumer(reconstructor)
+            total_points = reconstructor.finish()
+            refresh_scan_index_entry(reconstructor.scan_id)
+            socketio.emit('log_message', {'message': f"Live reconstruction finished with {total_points} points"})
+        # Persist the scan's upload counters now rather than on the next timer
+        flush_scan_index()
         # Update the scans list
         socketio.emit('update_scans_list', {'scans': get_all_scans()})
 
 # Processing worker function
-def process_scan_images(scan_id, status_queue):
-    try:
-        # Define paths
-        scan_dir = os.path.join(IMAGES_FOLDER, scan_id)
-        laser_on_dir = os.path.join(scan_dir, "laser_on")
-        laser_off_dir = os.path.join(scan_dir, "laser_off")
-        processed_dir = os.path.join(scan_dir, "processed")
-        cropped_dir = os.path.join(scan_dir, "cropped")
-        
-        # Check if cropped images exist and use those instead
-        if os.path.exists(cropped_dir) and os.path.exists(os.path.join(cropped_dir, "laser_on")):
-            laser_on_dir = os.path.join(cropped_dir, "laser_on")
-            laser_off_dir = os.path.join(cropped_dir, "laser_off")
-            status_queue.put({"status": "info", "message": "Using cropped images for processing"})
-        else:
-            laser_on_dir = os.path.join(scan_dir, "laser_on")
-            laser_off_dir = os.path.join(scan_dir, "laser_off")
-
-        # Create processed directory if it doesn't exist
-        os.makedirs(processed_dir, exist_ok=True)
-        
-        # Get matching image pairs
-        laser_on_files = sorted([f for f in os.listdir(laser_on_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        laser_off_files = sorted([f for f in os.listdir(laser_off_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        
-        # Ensure we have matching pairs
-        if len(laser_on_files) != len(laser_off_files):
-            status_queue.put({"status": "error", "message": "Mismatched number of images in laser_on and laser_off folders"})
-            return
-        
-        # Initialize all 3D points array
-        all_points_3d = []
-        
-        # Update status
-        status_queue.put({
-            "status": "starting", 
-            "message": f"Starting processing of {len(laser_on_files)} image pairs", 
-            "total_images": len(laser_on_files),
-            "processed_images": 0
-        })
-        
-        # Process each image pair
-        for i, (on_file, off_file) in enumerate(zip(laser_on_files, laser_off_files)):
-            try:
-                # Extract image number and calculate angle
-                img_num, angle = extract_metadata(on_file)
-                
-                # Update status
-                status_queue.put({
-                    "status": "processing", 
-                    "message": f"Processing image pair {i+1}/{len(laser_on_files)} (angle: {angle:.1f}°)",
-                    "processed_images": i,
-                    "current_angle": angle
-                })
-                
-                # Load images
-                laser_on_path = os.path.join(laser_on_dir, on_file)
-                laser_off_path = os.path.join(laser_off_dir, off_file)
-                
-                laser_on = cv2.imread(laser_on_path)
-                laser_off = cv2.imread(laser_off_path)
-                
-                if laser_on is None or laser_off is None:
-                    status_queue.put({"status": "warning", "message": f"Could not read images: {on_file} or {off_file}"})
-                    continue
-                
-                # Get image dimensions
-                height, width = laser_on.shape[:2]
-                
-                # Process images# Process images
-                processed_image, diff = preprocess_and_extract_line(laser_on, laser_off, scan_dir,img_num, angle)
-                
-                # Extract 2D points
-                points_2d = extract_laser_points(processed_image)
-                
-                # Convert to 3D
-                points_3d = convert_to_3d(points_2d, angle, width, height, img_num)
-                
-                # Add to all points
-                if len(points_3d) > 0:
-                    all_points_3d.extend(points_3d)
-                
-                # Save intermediate results
-                if len(points_2d) > 0:
-                    # Save processed image
-                    processed_path = os.path.join(processed_dir, f"processed_angle_{angle:.1f}.jpg")
-                    cv2.imwrite(processed_path, processed_image)
-                    
-                    # Visualize laser line on original image
-                    vis_img = laser_on.copy()
-                    for x, y in points_2d:
-                        cv2.circle(vis_img, (int(x), int(y)), 1, (0, 255, 0), -1)
-                        
-                    vis_path = os.path.join(processed_dir, f"detected_line_angle_{angle:.1f}.jpg")
-                    cv2.imwrite(vis_path, vis_img)
-                    
-                    # Update status with image info
-                    status_queue.put({
-                        "status": "image_processed",
-                        "angle": angle,
-                        "points_detected": len(points_2d),
-                        "processed_image_path": processed_path,
-                        "visualization_path": vis_path
-                    })
-                
-                # Small delay to allow for better visualization of progress
-                time.sleep(0.1)
-            except Exception as e:
-                status_queue.put({"status": "warning", "message": f"Error processing image pair {on_file}/{off_file}: {str(e)}"})
-        
-        # Save final point cloud
-        if all_points_3d:
-            output_ply = os.path.join(processed_dir, "reconstructed_model.ply")
-            ply_result = save_ply(all_points_3d, output_ply)
+def run_processing_job(job, scan_id, event_log):
+    """Scheduler target: process a scan, stopping early if the job is cancelled"""
+    process_scan_images(scan_id, event_log, job.cancel_event)
+    # Processing reports errors as events; fail the job so its state says so
+    if event_log.latest is not None and event_log.latest.get("status") == "error":
+        raise RuntimeError(event_log.latest.get("message"))
+
+def finish_processing_job(job):
+    """Scheduler callback for a finished or cancelled job"""
+    close_processing_job(job.job_id, job.state, job.priority, job.resources())
+
+def close_processing_job(scan_id, state, priority, resources):
+    """Record a job's resource use, then close its event log and persist the summary"""
+    global_metrics.observe("job_wait", resources["wait_seconds"])
+    if resources["run_seconds"]:
+        global_metrics.observe("job_run", resources["run_seconds"])
+    global_metrics.increment(f"jobs_{state}_total")
+    event_log = processing_jobs.get(scan_id)
+    if event_log is not None:
+        event_log.annotate(job_state=state, priority=priority, resources=resources)
+    processing_jobs.finish(scan_id)
+
+def relay_worker_jobs(last_seen_id):
+    """Mirror worker jobs and their status events into this process's event logs"""
+    watched = {}  # job id -> {"scan_id", "seq" (last relayed event), "position"}
+    last_prune = 0
+    while True:
+        try:
+            submitted = job_queue.jobs_after(last_seen_id)
+            active = job_queue.jobs()
+            active_ids = {job["id"] for job in active}
+            # Jobs submitted since the last poll are watched even if a worker already finished them
+            for job in submitted + active:
+                last_seen_id = max(last_seen_id, job["id"])
+                if job["id"] not in watched:
+                    processing_jobs.create_if_idle(job["scan_id"], _summary_path(job["scan_id"]))
+                    watched[job["id"]] = {"scan_id": job["scan_id"], "seq": 0, "position": None}
             
-            # Create processing_info.txt file
-            with open(os.path.join(processed_dir, "processing_info.txt"), 'w') as f:
-                f.write(f"Processed on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-                f.write(f"Total points: {len(all_points_3d)}\n")
-                f.write(f"Total images processed: {len(laser_on_files)}\n")
+            # Job states are read before events, so a finished job's last events are already written
+            finished = [(job_id, job_queue.get(job_id)) for job_id in watched if job_id not in active_ids]
             
-            status_queue.put({
-                "status": "completed", 
-                "message": ply_result,
-                "total_points": len(all_points_3d),
-                "ply_path": output_ply
-            })
-        else:
-            status_queue.put({
-                "status": "warning", 
-                "message": "No 3D points were generated. Check your image processing parameters."
-            })
+            while watched:
+                events = job_queue.events_after(min(entry["seq"] for entry in watched.values()), list(watched))
+                for seq, job_id, event in events:
+                    entry = watched[job_id]
+                    event_log = processing_jobs.get(entry["scan_id"])
+                    if seq <= entry["seq"]:
+                        continue
+                    # Stage timings recorded in the worker go to this process's /metrics
+                    if event.get("status") == "metrics":
+                        global_metrics.absorb(event["metrics"])
+                    elif event_log is not None:
+                        event_log.put(event)
+                    entry["seq"] = max(entry["seq"], seq)
+                if len(events) < 1000:
+                    break
             
-    except Exception as e:
-        status_queue.put({"status": "error", "message": f"Error during processing: {str(e)}"})
+            queued = [job for job in active if job["state"] == "queued"]
+            for position, job in enumerate(queued, start=1):
+                entry = watched[job["id"]]
+                event_log = processing_jobs.get(job["scan_id"])
+                if entry["position"] != position and event_log is not None:
+                    entry["position"] = position
+                    event_log.put({
+                        "status": "queued",
+                        "message": f"Waiting for a worker, {position - 1} job{'s' if position != 2 else ''} ahead",
+                        "queue_position": position
+                    })
+            
+            for job_id, job in finished:
+                scan_id = watched.pop(job_id)["scan_id"]
+                if job is None:
+                    job = {"state": "failed", "priority": 0, "resources": None}
+                resources = job["resources"] or {
+                    "wait_seconds": round((job.get("finished_at") or 0) - (job.get("submitted_at") or 0), 3),
+                    "run_seconds": 0.0,
+                    "cpu_seconds": 0.0
+                }
+                # The worker updated the scan index file; pick up its entry here too
+                refresh_scan_index_entry(scan_id)
+                close_processing_job(scan_id, job["state"], job["priority"], resources)
+            
+            if time.time() - last_prune > 60:
+                job_queue.prune(JOB_RETENTION_SECONDS)
+                last_prune = time.time()
+        except Exception as e:
+            logger.error(f"Error relaying worker jobs: {str(e)}")
+        time.sleep(WORKER_POLL_INTERVAL)
+
+background_threads_lock = threading.Lock()
+background_threads_started = False
+
+def start_background_threads():
+    """Start the job scheduler and, with the worker backend, the queue relay, once per process"""
+    global background_threads_started
+    with background_threads_lock:
+        if background_threads_started:
+            return
+        background_threads_started = True
+        processing_scheduler.start()
+        if job_queue is not None:
+            # Read before any job can be submitted, so the relay sees every job from here on
+            relay_thread = threading.Thread(target=relay_worker_jobs, args=(job_queue.last_job_id(),))
+            relay_thread.daemon = True
+            relay_thread.start()
+
+@app.before_request
+def ensure_background_threads():
+    # Started by the first request rather than on import, so the reloader's watching
+    # parent, which never serves requests, doesn't process jobs too; works under any WSGI server
+    if not background_threads_started:
+        start_background_threads()
+
+def _summary_path(scan_id):
+    return os.path.join(IMAGES_FOLDER, scan_id, "processed", PROCESSING_SUMMARY_FILE)
 
 # Flask Routes
 @app.route('/')
@@ -330,6 +391,20 @@ def check_esp32():
     else:
         return jsonify({'connected': False})
 
+@app.route('/esp32_stats', methods=['GET'])
+def esp32_stats():
+    return jsonify({
+        'host': esp32_controller.host,
+        'last_error': esp32_controller.last_error,
+        'commands': {command: dict(stats, buckets={str(k): v for k, v in stats['buckets'].items()})
+                     for command, stats in esp32_controller.latency_stats().items()}
+    })
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(render_prometheus(global_metrics, esp32_controller.latency_stats()),
+                    mimetype='text/plain; version=0.0.4')
+
 @app.route('/get_scans', methods=['GET'])
 def get_scans():
     scans = get_all_scans()
@@ -342,7 +417,11 @@ def delete_scan(scan_id):
         scan_path = os.path.join(IMAGES_FOLDER, scan_id)
         logger.error(f"{scan_id} {scan_path}")
         if os.path.exists(scan_path) and scan_id.startswith("scan_"):
+            active_scan = get_active_scan()
+            if active_scan is not None and active_scan.scan_id == scan_id:
+                set_active_scan(None)
             shutil.rmtree(scan_path)
+            remove_scan_from_index(scan_id)
             socketio.emit('log_message', {'message': f"Deleted scan: {scan_id}"})
             return jsonify({'success': True, 'message': f"Deleted scan: {scan_id}"})
         else:
@@ -356,55 +435,98 @@ def process_scan_route(scan_id):
     try:
         scan_path = os.path.join(IMAGES_FOLDER, scan_id)
         if os.path.exists(scan_path) and scan_id.startswith("scan_"):
-            # Check if already processing
-            if scan_id in processing_status and processing_status[scan_id].get("status") == "active":
-                return jsonify({"success": False, "message": "Already processing this scan"}), 400
+            # Higher priority jobs start first, equal priorities in request order
+            data = request.get_json(silent=True) or {}
+            try:
+                priority = int(data.get('priority', request.args.get('priority', 0)))
+            except (TypeError, ValueError):
+                return jsonify({"success": False, "message": "priority must be an integer"}), 400
             
-            # Initialize status queue and processing thread
-            status_queue = queue.Queue()
-            processing_status[scan_id] = {"status": "active", "queue": status_queue}
-            processing_results[scan_id] = []
+            # Initialize the event log; checked and created under one lock so concurrent requests queue one job
+            event_log = processing_jobs.create_if_idle(scan_id, _summary_path(scan_id))
+            if event_log is None:
+                return jsonify({"success": False, "message": "Already processing this scan"}), 400
             
-            # Start processing in a separate thread
-            thread = threading.Thread(target=process_scan_images, args=(scan_id, status_queue))
-            thread.daemon = True
-            thread.start()
+            # Queue the job
+            try:
+                queue_full = job_queue.queued_count() >= MAX_QUEUED_JOBS if job_queue is not None else processing_scheduler.is_full()
+                if queue_full:
+                    raise QueueFullError("Too many scans are waiting to be processed")
+                if job_queue is not None:
+                    job_queue.submit(scan_id, priority)
+                    queue_position = None
+                else:
+                    processing_scheduler.submit(scan_id, run_processing_job, (scan_id, event_log), priority, event_log)
+                    queue_position = processing_scheduler.queue_position(scan_id)
+            except Exception as e:
+                # Without a job nothing would ever close the log, leaving the scan "already processing"
+                processing_jobs.discard(scan_id, event_log)
+                if isinstance(e, QueueFullError):
+                    return jsonify({"success": False, "message": str(e)}), 429
+                if isinstance(e, ValueError):
+                    return jsonify({"success": False, "message": str(e)}), 400
+                raise
             
-            socketio.emit('log_message', {'message': f"Started processing scan: {scan_id}"})
-            return jsonify({'success': True, 'message': f"Started processing scan: {scan_id}"})
+            socketio.emit('log_message', {'message': f"Queued processing of scan: {scan_id}"})
+            return jsonify({'success': True, 'message': f"Queued processing of scan: {scan_id}",
+                            'queue_position': queue_position})
         else:
             return jsonify({'success': False, 'message': "Invalid scan ID"})
     except Exception as e:
         logger.error(f"Error processing scan: {str(e)}")
         return jsonify({'success': False, 'message': f"Error processing scan: {str(e)}"})
 
+@app.route('/cancel_processing/<scan_id>', methods=['POST'])
+def cancel_processing(scan_id):
+    state = job_queue.cancel(scan_id) if job_queue is not None else processing_scheduler.cancel(scan_id)
+    if state is None:
+        return jsonify({'success': False, 'message': "No queued or running job for this scan"}), 404
+    
+    message = "Cancelled queued job" if state == "queued" else "Cancelling, the job stops after the current image pair"
+    socketio.emit('log_message', {'message': f"{message}: {scan_id}"})
+    return jsonify({'success': True, 'message': message})
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    if job_queue is not None:
+        jobs = job_queue.jobs()
+        return jsonify({"running": [job for job in jobs if job["state"] == "running"],
+                        "queued": [dict(job, queue_position=position)
+                                   for position, job in enumerate((job for job in jobs if job["state"] == "queued"), start=1)]})
+    return jsonify(processing_scheduler.snapshot())
+
 @app.route('/api/status/<scan_id>')
 def stream_status(scan_id):
+    # Browsers resend the last id they saw when reconnecting
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id', '0')
+    after_seq = int(last_event_id) if last_event_id.isdigit() else 0
+    
     def generate():
-        if scan_id not in processing_status:
+        event_log = processing_jobs.get(scan_id)
+        if event_log is None:
             yield f"data: {json.dumps({'status': 'error', 'message': 'Scan not found'})}\n\n"
             return
-            
-        status_queue = processing_status[scan_id]["queue"]
         
+        seq = after_seq
         while True:
             try:
-                # Non-blocking queue get with timeout
-                status_update = status_queue.get(timeout=0.5)
-                processing_results[scan_id].append(status_update)
+                events, done = event_log.read(seq, SSE_HEARTBEAT)
+                if not events:
+                    if done:
+                        break
+                    # Send heartbeat to keep connection alive
+                    yield f"data: {json.dumps({'status': 'heartbeat'})}\n\n"
+                    continue
                 
-                # Send the update as a server-sent event
-                yield f"data: {json.dumps(status_update)}\n\n"
+                for seq, published_at, status_update in events:
+                    global_metrics.observe("sse_delivery", time.perf_counter() - published_at)
+                    # Send the update as a server-sent event
+                    yield f"id: {seq}\ndata: {json.dumps(status_update)}\n\n"
                 
                 # If processing is complete, exit
-                if status_update.get("status") in ["completed", "error"]:
-                    processing_status[scan_id]["status"] = "inactive"
+                if status_update.get("status") in TERMINAL_STATUSES:
                     break
                     
-            except queue.Empty:
-                # Send heartbeat to keep connection alive
-                yield f"data: {json.dumps({'status': 'heartbeat'})}\n\n"
-                
             except Exception as e:
                 yield f"data: {json.dumps({'status': 'error', 'message': str(e)})}\n\n"
                 break
@@ -413,10 +535,15 @@ def stream_status(scan_id):
 
 @app.route('/api/results/<scan_id>')
 def get_results(scan_id):
-    if scan_id not in processing_results:
+    event_log = processing_jobs.get(scan_id)
+    if event_log is not None:
+        return jsonify({"results": event_log.events(), "summary": event_log.summary()})
+    
+    # Evicted or from an earlier run of the server
+    summary = load_summary(_summary_path(scan_id))
+    if summary is None:
         return jsonify({"error": "Scan not found"}), 404
-        
-    return jsonify({"results": processing_results[scan_id]})
+    return jsonify({"results": [], "summary": summary})
 
 @app.route('/download_processed/<scan_id>', methods=['GET'])
 def download_processed(scan_id):
@@ -443,6 +570,27 @@ def view_model(scan_id):
         logger.error(f"Error viewing model: {str(e)}")
         return jsonify({'success': False, 'message': f"Error viewing model: {str(e)}"}), 500
 
+@app.route('/tiles/<scan_id>/<path:filename>', methods=['GET'])
+def get_tile(scan_id, filename):
+    tiles_dir = os.path.abspath(os.path.join(IMAGES_FOLDER, scan_id, "processed", TILES_DIR))
+    if not scan_id.startswith("scan_") or not os.path.exists(os.path.join(tiles_dir, TILE_INDEX_FILE)):
+        return jsonify({'success': False, 'message': "Tiles not found"}), 404
+    
+    # The index changes on every rebuild, so browsers revalidate it by ETag
+    if filename == TILE_INDEX_FILE:
+        response = send_from_directory(tiles_dir, filename, mimetype='application/json', max_age=0)
+        response.cache_control.no_cache = True
+        return response
+    
+    # Tiles requested with the index version never change under that URL
+    response = send_from_directory(tiles_dir, filename, mimetype='application/octet-stream')
+    if request.args.get('v'):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = TILE_CACHE_SECONDS
+        response.cache_control.immutable = True
+    return response
+
 @app.route('/laser-on', methods=['POST'])
 def laser_on():
     response = esp32_laser_on()
@@ -492,34 +640,74 @@ def api_stop_scan():
     
     return jsonify({'success': True, 'message': "Scan stopping..."})
 
+def ingest_frame(step, mode, write):
+    """Store a frame from the phone in the active scan and hand it on"""
+    start = time.perf_counter()
+    
+    # Frames go to the scan being captured; after a restart, the newest scan
+    active_scan = get_active_scan()
+    if active_scan is None:
+        scan_id = latest_scan_id()
+        if scan_id is None:
+            return {'success': False, 'message': "No scan directory found"}
+        active_scan = ActiveScan(os.path.join(IMAGES_FOLDER, scan_id), UPLOAD_FRAME_HANDOFF)
+        set_active_scan(active_scan)
+    
+    filename = f"image_{step}.jpg"
+    save_path = active_scan.target_path(mode, filename)
+    if save_path is None:
+        return {'success': False, 'message': f"Unknown mode: {mode}"}
+    
+    # Save the image
+    replaced_bytes = os.path.getsize(save_path) if os.path.exists(save_path) else None
+    size_bytes, frame_data = write(active_scan, save_path)
+    record_image_upload(active_scan.scan_id, mode, size_bytes, replaced_bytes)
+    
+    # Release the scan loop waiting for this frame
+    if step.isdigit():
+        capture_handshake.frame_received(int(step))
+        requested_at = capture_requested_at.pop(int(step), None)
+        if requested_at is not None:
+            global_metrics.observe("frame_latency", time.perf_counter() - requested_at)
+    
+    # Hand the frame to consumers such as the live reconstruction
+    active_scan.publish(step, mode, save_path, frame_data)
+    
+    global_metrics.increment("uploads_total")
+    global_metrics.increment("upload_bytes_total", size_bytes)
+    global_metrics.observe("upload", time.perf_counter() - start)
+    
+    socketio.emit('log_message', {'message': f"Image saved: {filename} (Mode: {mode})"})
+    return {'success': True, 'message': f"Image {filename} saved"}
+
 @app.route('/upload-image', methods=['POST'])
 def upload_image():
     if 'image' not in request.files:
         return jsonify({'success': False, 'message': "No image provided"})
     
-    try:
-        image = request.files['image']
-        step = request.form.get('step', '0')
-        mode = request.form.get('mode', 'unknown')
-        
-        # Get current scan directory
-        scan_dirs = [d for d in os.listdir(IMAGES_FOLDER) if os.path.isdir(os.path.join(IMAGES_FOLDER, d))]
-        if not scan_dirs:
-            return jsonify({'success': False, 'message': "No scan directory found"})
-        
-        latest_scan_dir = os.path.join(IMAGES_FOLDER, sorted(scan_dirs)[-1])
-        
-        # Save the image
-        filename = f"image_{step}.jpg"
-        save_path = os.path.join(latest_scan_dir, mode, filename)
+    image = request.files['image']
+    upload = image.stream if isinstance(image.stream, UploadFile) else None
+    
+    def write(active_scan, save_path):
+        nonlocal upload
+        # Streamed uploads are already on disk and only renamed
+        if upload is not None:
+            committed, upload = upload, None
+            return committed.commit(save_path), committed.data
         image.save(save_path)
-        
-        socketio.emit('log_message', {'message': f"Image saved: {filename} (Mode: {mode})"})
-        return jsonify({'success': True, 'message': f"Image {filename} saved"})
+        return os.path.getsize(save_path), None
+    
+    try:
+        return jsonify(ingest_frame(request.form.get('step', '0'), request.form.get('mode', 'unknown'), write))
     
     except Exception as e:
         logger.error(f"Error saving image: {str(e)}")
         return jsonify({'success': False, 'message': f"Error saving image: {str(e)}"})
+    
+    finally:
+        # Drop the partial file of an upload that was not saved
+        if upload is not None:
+            upload.discard()
 
 @app.route('/crop_scan/<scan_id>', methods=['POST'])
 def crop_scan_route(scan_id):
@@ -530,7 +718,8 @@ def crop_scan_route(scan_id):
         if not crop_coords or not all(k in crop_coords for k in ['x', 'y', 'width', 'height']):
             return jsonify({"success": False, "message": "Invalid crop coordinates"}), 400
         print(crop_coords, scan_id)
-        result = crop_images(scan_id, crop_coords)
+        result = crop_images(scan_id, crop_coords, materialize=bool(data.get('materialize', False)))
+        refresh_scan_index_entry(scan_id)
         
         if result["success"]:
             socketio.emit('log_message', {'message': result["message"]})
@@ -542,6 +731,24 @@ def crop_scan_route(scan_id):
         logger.error(f"Error handling crop request: {str(e)}")
         return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
 
+@app.route('/calibration/<scan_id>', methods=['POST'])
+def set_calibration(scan_id):
+    try:
+        scan_path = os.path.join(IMAGES_FOLDER, scan_id)
+        if not (os.path.exists(scan_path) and scan_id.startswith("scan_")):
+            return jsonify({"success": False, "message": "Invalid scan ID"}), 404
+        
+        data = request.json
+        if not data or 'camera_matrix' not in data or 'dist_coeffs' not in data:
+            return jsonify({"success": False, "message": "camera_matrix and dist_coeffs are required"}), 400
+        
+        save_calibration(os.path.join(scan_path, SCAN_CALIBRATION_FILE), data['camera_matrix'], data['dist_coeffs'])
+        return jsonify({"success": True, "message": f"Saved calibration for {scan_id}"})
+    
+    except Exception as e:
+        logger.error(f"Error saving calibration: {str(e)}")
+        return jsonify({"success": False, "message": f"Error: {str(e)}"}), 500
+
 @app.route('/preview_first_image/<scan_id>', methods=['GET'])
 def preview_first_image(scan_id):
     try:
@@ -580,6 +787,7 @@ def handle_phone_connected():
     connected_phones.add(request.sid)
     socketio.emit('log_message', {'message': f"Phone connected: {request.sid}"})
     socketio.emit('phones_count', {'count': len(connected_phones)})
+    socketio.emit('capture_settings', capture_settings(), room=request.sid)
 
     @socketio.on('image_captured')
     def handle_image_captured(data):
@@ -594,23 +802,49 @@ def handle_phone_connected():
         scans = get_all_scans()
         socketio.emit('update_scans_list', {'scans': scans})
 
+def capture_settings():
+    """Encoding and transport settings the phone client applies to its frames"""
+    return {
+        'jpeg_quality': CAPTURE_JPEG_QUALITY,
+        'max_width': CAPTURE_MAX_WIDTH,
+        'max_height': CAPTURE_MAX_HEIGHT,
+        'transport': FRAME_TRANSPORT,
+        'batch_size': FRAME_BATCH_SIZE,
+        'batch_max_bytes': FRAME_BATCH_MAX_BYTES,
+        'max_in_flight': FRAME_MAX_IN_FLIGHT
+    }
+
+@socketio.on('frame_batch')
+def handle_frame_batch(data):
+    """Save a batch of binary frames; the return value acknowledges each frame"""
+    results = []
+    for frame in (data or {}).get('frames', []):
+        step = str(frame.get('step', '0'))
+        mode = frame.get('mode', 'unknown')
+        image = frame.get('image')
+        try:
+            if not isinstance(image, (bytes, bytearray)):
+                result = {'success': False, 'message': "No image provided"}
+            else:
+                result = ingest_frame(step, mode, lambda active_scan, save_path: (active_scan.write_frame(image, save_path), image))
+        except Exception as e:
+            logger.error(f"Error saving image: {str(e)}")
+            result = {'success': False, 'message': f"Error saving image: {str(e)}"}
+        results.append(dict(result, step=step, mode=mode))
+    
+    global_metrics.increment("frame_batches_total")
+    return {'frames': results}
+
 @socketio.on('request_processing_status')
 def handle_request_processing_status(data):
     scan_id = data.get('scan_id')
-    if scan_id and scan_id in processing_status:
-        if scan_id in processing_results and processing_results[scan_id]:
-            latest_result = processing_results[scan_id][-1]
-            socketio.emit('processing_status_update', {
-                'scan_id': scan_id,
-                'status': processing_status[scan_id]["status"],
-                'latest_update': latest_result
-            }, room=request.sid)
-        else:
-            socketio.emit('processing_status_update', {
-                'scan_id': scan_id,
-                'status': processing_status[scan_id]["status"],
-                'latest_update': {"status": "waiting", "message": "Waiting for updates"}
-            }, room=request.sid)
+    event_log = processing_jobs.get(scan_id) if scan_id else None
+    if event_log is not None:
+        socketio.emit('processing_status_update', {
+            'scan_id': scan_id,
+            'status': "inactive" if event_log.done else "active",
+            'latest_update': event_log.latest or {"status": "waiting", "message": "Waiting for updates"}
+        }, room=request.sid)
     else:
         socketio.emit('processing_status_update', {
             'scan_id': scan_id if scan_id else "unknown",
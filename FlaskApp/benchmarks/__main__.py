@@ -0,0 +1,233 @@
+# benchmarks/__main__.py
+"""Stage-level benchmarks for the image-to-point-cloud pipeline
+
+Run from the FlaskApp directory:
+
+    python -m benchmarks --pairs 50 --save-baseline
+    python -m benchmarks --pairs 50            # fails if a stage regressed
+
+Generates a synthetic scan, times every stage (best of --repeat runs),
+records each stage's peak traced memory, writes the results as JSON and
+compares them with the stored baseline. The exit status is 1 when any
+stage is slower than the baseline by more than --threshold. Without a
+baseline the comparison is skipped, or the run fails with status 2 under
+--require-baseline.
+"""
+import os
+import sys
+import json
+import time
+import queue
+import shutil
+import platform
+import argparse
+import tracemalloc
+import statistics
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_BASELINE = os.path.join(APP_DIR, "benchmarks", "baseline.json")
+
+def _time_stage(run, repeat, setup=None):
+    """Best and median wall time of run(), then one traced run for peak memory"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        "seconds": min(times),
+        "median_seconds": statistics.median(times),
+        "peak_traced_bytes": peak
+    }
+
+def run_benchmarks(args):
+    import cv2
+    import numpy as np
+    from benchmarks.synthetic import make_scan
+    from modules.image_processor import preprocess_and_extract_line, extract_laser_points, crop_images, sort_by_step
+    from modules.point_cloud import convert_to_3d, save_ply, VoxelGrid, remove_outliers
+    from modules import processing
+    from modules.point_store import POINT_STORE_DIR
+    from config import IMAGES_FOLDER
+
+    # Time the cold pipeline, not stage cache hits from the previous repeat
+    processing.STAGE_CACHE_FOLDER = None
+
+    scan_id = f"scan_bench_{args.width}x{args.height}_{args.pairs}"
+    scan_dir = make_scan(IMAGES_FOLDER, scan_id, args.pairs, args.width, args.height)
+    on_paths = [os.path.join(scan_dir, "laser_on", f) for f in sort_by_step(os.listdir(os.path.join(scan_dir, "laser_on")))]
+    off_paths = [os.path.join(scan_dir, "laser_off", f) for f in sort_by_step(os.listdir(os.path.join(scan_dir, "laser_off")))]
+    steps = range(1, args.pairs + 1)
+
+    # Inputs for each stage come from the stage before it
+    frames = [(cv2.imread(on), cv2.imread(off)) for on, off in zip(on_paths, off_paths)]
+    processed = [preprocess_and_extract_line(on, off, scan_dir, step, step * 1.8, artifact_level="none")[0]
+                 for (on, off), step in zip(frames, steps)]
+    points_2d = [extract_laser_points(image) for image in processed]
+    points_3d = np.concatenate([convert_to_3d(p, step * 1.8, args.width, args.height, step)
+                                for p, step in zip(points_2d, steps)])
+    ply_path = os.path.join(scan_dir, "bench.ply")
+    crop = {"x": args.width // 8, "y": args.height // 8, "width": args.width * 3 // 4, "height": args.height * 3 // 4}
+
+    def decode():
+        for on, off in zip(on_paths, off_paths):
+            cv2.imread(on)
+            cv2.imread(off)
+
+    def preprocess():
+        for (on, off), step in zip(frames, steps):
+            preprocess_and_extract_line(on, off, scan_dir, step, step * 1.8, artifact_level="none")
+
+    def extract():
+        for image in processed:
+            extract_laser_points(image)
+
+    def triangulate():
+        for p, step in zip(points_2d, steps):
+            convert_to_3d(p, step * 1.8, args.width, args.height, step)
+
+    def downsample():
+        grid = VoxelGrid(2.0)
+        for p in np.array_split(points_3d, args.pairs):
+            grid.add(p)
+        grid.finish()
+
+    def outliers():
+        remove_outliers(points_3d, neighbors=8, radius=10)
+
+    def write_binary():
+        save_ply(points_3d, ply_path)
+
+    def write_ascii():
+        save_ply(points_3d, ply_path, "ascii")
+
+    def crop_materialize():
+        crop_images(scan_id, crop, base_dir=IMAGES_FOLDER, materialize=True)
+
+    def fresh_pipeline():
+        # Without this every run after the first resumes a finished point store
+        shutil.rmtree(os.path.join(scan_dir, "processed", POINT_STORE_DIR), ignore_errors=True)
+
+    def full_pipeline():
+        status_queue = queue.Queue()
+        processing.process_scan_images(scan_id, status_queue)
+        while not status_queue.empty():
+            update = status_queue.get()
+            if update.get("status") == "error":
+                raise RuntimeError(update.get("message"))
+
+    stages = {
+        "decode": decode,
+        "preprocess_and_extract_line": preprocess,
+        "extract_laser_points": extract,
+        "convert_to_3d": triangulate,
+        "voxel_downsample": downsample,
+        "remove_outliers": outliers,
+        "save_ply_binary": write_binary,
+        "save_ply_ascii": write_ascii,
+        "crop_images_materialize": crop_materialize,
+        "process_scan_images": full_pipeline
+    }
+    setups = {"process_scan_images": fresh_pipeline}
+    selected = args.stages or list(stages)
+
+    results = {}
+    for name in selected:
+        results[name] = _time_stage(stages[name], args.repeat, setups.get(name))
+        print(f"{name:32s} {results[name]['seconds'] * 1000:10.1f} ms  "
+              f"peak {results[name]['peak_traced_bytes'] / 1e6:8.1f} MB", file=sys.stderr)
+
+        # Leave the scan as captured so later stages see the same input
+        if name == "crop_images_materialize":
+            shutil.rmtree(os.path.join(scan_dir, "cropped"), ignore_errors=True)
+            os.remove(os.path.join(scan_dir, "crop.json"))
+
+    return {
+        "params": {"width": args.width, "height": args.height, "pairs": args.pairs, "repeat": args.repeat},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "opencv": cv2.__version__,
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count()
+        },
+        "points": len(points_3d),
+        "stages": results
+    }
+
+def compare(results, baseline, threshold):
+    """Return the stages that are slower than the baseline by more than threshold"""
+    if baseline.get("params") != results["params"]:
+        print("Baseline was recorded with different parameters, comparison may be meaningless", file=sys.stderr)
+
+    regressions = []
+    for name, stage in results["stages"].items():
+        reference = baseline.get("stages", {}).get(name)
+        if not reference:
+            continue
+        ratio = stage["seconds"] / reference["seconds"]
+        status = "REGRESSION" if ratio > 1 + threshold else "ok"
+        print(f"{name:32s} {ratio:6.2f}x baseline  {status}", file=sys.stderr)
+        if status != "ok":
+            regressions.append({"stage": name, "ratio": ratio})
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Image-to-point-cloud stage benchmarks")
+    parser.add_argument("--width", type=int, default=1024)
+    parser.add_argument("--height", type=int, default=1024)
+    parser.add_argument("--pairs", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", help="Only run these stages")
+    parser.add_argument("--workdir", help="Directory for the synthetic scans (default: a benchmarks work folder)")
+    parser.add_argument("--output", default="benchmark_results.json", help="Where to write the results JSON")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown before failing, e.g. 0.2 = 20%%")
+    parser.add_argument("--require-baseline", action="store_true", help="Fail instead of skipping the comparison when there is no baseline")
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    baseline_path = os.path.abspath(args.baseline)
+    # Fail before the (slow) runs rather than after them
+    if args.require_baseline and not args.save_baseline and not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}; run with --save-baseline first", file=sys.stderr)
+        sys.exit(2)
+    workdir = args.workdir or os.path.join(APP_DIR, "benchmarks", "work")
+    os.makedirs(workdir, exist_ok=True)
+
+    # IMAGES_FOLDER is relative, so scans land inside the work directory
+    os.chdir(workdir)
+    sys.path.insert(0, APP_DIR)
+
+    results = run_benchmarks(args)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(baseline_path, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Saved baseline to {baseline_path}", file=sys.stderr)
+        return
+
+    if not os.path.exists(baseline_path):
+        print(f"No baseline at {baseline_path}, comparison skipped; run with --save-baseline to create one", file=sys.stderr)
+        return
+
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    if compare(results, baseline, args.threshold):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
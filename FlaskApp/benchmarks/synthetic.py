@@ -0,0 +1,20 @@
+# benchmarks/synthetic.py
+import os
+
+from simulator.scene import Scene
+from modules.point_cloud import STEPS_PER_REVOLUTION
+
+def make_scan(images_folder, scan_id, pairs=200, width=640, height=480, shape="vase", jpeg_quality=95):
+    """Write a synthetic scan directory laid out like a captured one"""
+    scan_dir = os.path.join(images_folder, scan_id)
+    scene = Scene(shape, width, height)
+    for mode in ("laser_on", "laser_off"):
+        os.makedirs(os.path.join(scan_dir, mode), exist_ok=True)
+
+    for step in range(1, pairs + 1):
+        for mode, frame_step in (("laser_on", step), ("laser_off", step + STEPS_PER_REVOLUTION)):
+            path = os.path.join(scan_dir, mode, f"image_{frame_step}.jpg")
+            if not os.path.exists(path):
+                with open(path, "wb") as f:
+                    f.write(scene.encode(frame_step, mode, jpeg_quality))
+    return scan_dir
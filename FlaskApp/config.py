@@ -9,11 +9,75 @@ DEBUG = True
 
 # ESP32 configuration
 ESP32_IP = "192.168.236.90"
+ESP32_TIMEOUT = 5  # Seconds per HTTP command
+ESP32_RETRIES = 2  # Extra attempts after a failed command
+ESP32_BACKOFF = 0.2  # Initial retry delay in seconds, doubled per attempt
 TIME_DELAY = 0.5
 
+# Capture handshake: wait for each frame's upload instead of fixed TIME_DELAY sleeps
+CAPTURE_HANDSHAKE = False
+CAPTURE_TIMEOUT = 5.0  # Seconds to wait for a frame before re-requesting it
+CAPTURE_RETRIES = 2
+UPLOAD_FRAME_HANDOFF = True  # Pass uploaded frame bytes to live reconstruction instead of re-reading them
+
+# Phone capture encoding and frame transport, sent to the phone when it connects
+CAPTURE_JPEG_QUALITY = 95  # 1-100
+CAPTURE_MAX_WIDTH = None  # Frames are scaled down to fit, keeping the aspect ratio; None or 0 = camera resolution
+CAPTURE_MAX_HEIGHT = None
+FRAME_TRANSPORT = "socketio"  # "socketio" (binary batches on the open connection) or "http" (one POST per frame)
+FRAME_BATCH_SIZE = 4  # Most frames per Socket.IO batch
+FRAME_BATCH_MAX_BYTES = 4 * 1024 * 1024  # Most encoded bytes per batch
+FRAME_MAX_IN_FLIGHT = 2  # Unacknowledged batches before the phone waits
+
 # Scanning parameters
 TOTAL_STEPS = 400
 
+# Processing parameters
+LASER_THRESHOLD = 0  # Minimum peak brightness for a row to count as laser
+SUBPIXEL_MODE = None  # None, "centroid" or "parabolic"
+PLY_FORMAT = "binary_little_endian"  # or "ascii"
+ARTIFACT_LEVEL = "summary"  # "none", "summary" (per-angle overlays) or "full" (every intermediate stage)
+PROCESSING_WORKERS = 1  # 1 = serial, N = process pool of N workers, 0 = one per CPU core
+DECODE_SCALE = 1  # 1, or 2 / 4 / 8 to decode JPEG frames at reduced resolution
+LIVE_RECONSTRUCTION = False  # Reconstruct image pairs while the scan is still capturing
+VOXEL_SIZE = 0  # Voxel edge length for downsampling the cloud, 0 = keep every point
+VOXEL_POLICY = "centroid"  # "centroid" (mean of each voxel's points) or "first" (first point to hit a voxel)
+OUTLIER_NEIGHBORS = 0  # k for statistical outlier removal (mean distance to k nearest points), 0 = off
+OUTLIER_STD_RATIO = 2.0  # Drop points whose mean k-neighbour distance is this many std devs above average
+OUTLIER_RADIUS = 0  # Radius outlier removal search radius, 0 = off
+OUTLIER_MIN_NEIGHBORS = 4  # Points with fewer neighbours within OUTLIER_RADIUS are dropped
+MESH_EXPORT = False  # Also triangulate the organized angle x row grid into a mesh
+MESH_EXPORT_FORMATS = ("ply",)  # "ply" (binary) and/or "obj"
+MESH_MAX_EDGE = 0  # Longest triangle edge before it is treated as a gap, 0 = automatic
+TILE_EXPORT = True  # Build level-of-detail octree tiles for the web viewer
+TILE_MAX_POINTS = 50000  # Most points stored in one tile
+TILE_CACHE_SECONDS = 31536000  # Browser cache lifetime of versioned tiles
+
+# Processing status events
+EVENT_LOG_SIZE = 500  # Status events kept per processing job
+PROGRESS_INTERVAL = 0.25  # Minimum seconds between progress events of one kind
+MAX_FINISHED_JOBS = 20  # Finished jobs whose event logs stay in memory
+JOB_RETENTION_SECONDS = 3600  # Finished jobs older than this are evicted
+SSE_HEARTBEAT = 15  # Seconds without events before a heartbeat is sent
+
+# Processing job scheduler
+MAX_CONCURRENT_JOBS = 1  # Scans processed at the same time, the rest wait in the queue
+MAX_QUEUED_JOBS = 20  # Further processing requests are rejected while this many are waiting
+PROCESSING_BACKEND = "thread"  # "thread" (in the web process) or "worker" (separate `python -m worker` processes)
+JOB_QUEUE_FILE = "processing_queue.db"  # SQLite queue shared by the web process and workers
+WORKER_POLL_INTERVAL = 0.5  # Seconds between queue polls, in workers and the web process
+WORKER_LEASE_SECONDS = 30  # A job whose worker stops renewing this long is handed to another worker
+WORKER_MAX_ATTEMPTS = 3  # Claims of one job before it is failed
+
+# Device-wide camera calibration (JSON with camera_matrix and dist_coeffs)
+CALIBRATION_FILE = "calibration.json"
+
 # Storage configuration
 IMAGES_FOLDER = "scan_images"
-os.makedirs(IMAGES_FOLDER, exist_ok=True)
\ No newline at end of file
+os.makedirs(IMAGES_FOLDER, exist_ok=True)
+SCAN_INDEX_SAVE_INTERVAL = 2.0  # Seconds upload counters may stay in memory before the scan index is rewritten
+
+# Stage results keyed by frame file stats and stage parameters
+STAGE_CACHE_FOLDER = os.path.join(IMAGES_FOLDER, "stage_cache")  # None = no cache
+STAGE_CACHE_STAGES = ("lines",)  # "lines" (2D laser line, a few KB per pair) and/or "preprocess" (blurred difference image, a full frame per pair)
+STAGE_CACHE_MAX_BYTES = 512 * 1024 * 1024  # Least recently used entries are removed beyond this
\ No newline at end of file
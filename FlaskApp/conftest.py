@@ -0,0 +1,2 @@
+# conftest.py
+# Lets tests import the app's top-level packages (modules, config) as the server does
@@ -0,0 +1,74 @@
+# modules/artifacts.py
+import time
+import queue
+import logging
+import threading
+from multiprocessing import util
+import cv2
+
+from modules.metrics import global_metrics
+
+logger = logging.getLogger(__name__)
+
+# "none" writes nothing, "summary" writes the per-angle processed image and
+# detected-line overlay, "full" also keeps every intermediate stage
+ARTIFACT_LEVELS = ("none", "summary", "full")
+
+class ArtifactWriter:
+    """Encode and write debug images on a background thread; submitted arrays must not be modified afterwards"""
+
+    def __init__(self, max_pending=64):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def submit(self, path, image):
+        """Queue an image to be written to path"""
+        self._queue.put((path, image))
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            path, image = item
+            try:
+                start = time.perf_counter()
+                cv2.imwrite(path, image)
+                # Only reaches /metrics for writers in the web process
+                global_metrics.observe("artifact_write", time.perf_counter() - start)
+            except Exception as e:
+                logger.error(f"Error writing artifact {path}: {str(e)}")
+
+    def close(self):
+        """Write everything still queued and stop the thread"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+
+# Writer owned by the current process pool worker, if any
+_worker_writer = None
+
+def init_worker_writer():
+    """Give a pool worker its own writer, flushed when the worker exits"""
+    global _worker_writer
+    _worker_writer = ArtifactWriter()
+    util.Finalize(_worker_writer, _worker_writer.close, exitpriority=10)
+
+def worker_writer():
+    """Return the current worker's writer, or None outside a pool worker"""
+    return _worker_writer
+
+def save_artifact(path, image, writer=None):
+    """Write an image now, or hand it to a background writer"""
+    if writer is None:
+        cv2.imwrite(path, image)
+    else:
+        writer.submit(path, image)
+
+def artifact_enabled(level, required):
+    """Check whether artifacts of the required level should be written"""
+    if level not in ARTIFACT_LEVELS:
+        raise ValueError(f"Unknown artifact level: {level}")
+    return ARTIFACT_LEVELS.index(level) >= ARTIFACT_LEVELS.index(required)
@@ -0,0 +1,69 @@
+# modules/calibration.py
+import os
+import json
+import logging
+from functools import lru_cache
+import cv2
+import numpy as np
+from config import CALIBRATION_FILE
+
+logger = logging.getLogger(__name__)
+
+# Calibration stored next to a scan overrides the device-wide file
+SCAN_CALIBRATION_FILE = "calibration.json"
+
+# Distinct (calibration, resolution) remap tables kept in memory
+UNDISTORT_CACHE_SIZE = 8
+
+def save_calibration(path, camera_matrix, dist_coeffs):
+    """Save camera intrinsics and distortion coefficients as JSON"""
+    camera_matrix = np.asarray(camera_matrix, dtype=np.float64).reshape(3, 3)
+    dist_coeffs = np.asarray(dist_coeffs, dtype=np.float64).ravel()
+    with open(path, 'w') as f:
+        json.dump({
+            "camera_matrix": camera_matrix.tolist(),
+            "dist_coeffs": dist_coeffs.tolist()
+        }, f, indent=2)
+
+def _read_calibration(path):
+    with open(path) as f:
+        data = json.load(f)
+    camera_matrix = np.asarray(data["camera_matrix"], dtype=np.float64).reshape(3, 3)
+    dist_coeffs = np.asarray(data["dist_coeffs"], dtype=np.float64).ravel()
+    return camera_matrix, dist_coeffs
+
+def load_calibration(scan_dir=None):
+    """Load (camera_matrix, dist_coeffs) for a scan, preferring its own calibration.json, or (None, None)"""
+    candidates = []
+    if scan_dir is not None:
+        candidates.append(os.path.join(scan_dir, SCAN_CALIBRATION_FILE))
+    if CALIBRATION_FILE:
+        candidates.append(CALIBRATION_FILE)
+
+    for path in candidates:
+        if not os.path.exists(path):
+            continue
+        try:
+            return _read_calibration(path)
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Invalid calibration file {path}: {str(e)}")
+    return None, None
+
+@lru_cache(maxsize=UNDISTORT_CACHE_SIZE)
+def _undistort_maps(camera_key, dist_key, size):
+    camera_matrix = np.array(camera_key, dtype=np.float64).reshape(3, 3)
+    dist_coeffs = np.array(dist_key, dtype=np.float64)
+    # Same output camera as cv2.undistort, with compact fixed-point maps
+    return cv2.initUndistortRectifyMap(camera_matrix, dist_coeffs, None, camera_matrix, size, cv2.CV_16SC2)
+
+def get_undistort_maps(camera_matrix, dist_coeffs, size):
+    """Return cached remap tables for a calibration and (width, height)"""
+    camera_key = tuple(np.asarray(camera_matrix, dtype=np.float64).ravel().tolist())
+    dist_key = tuple(np.asarray(dist_coeffs, dtype=np.float64).ravel().tolist())
+    return _undistort_maps(camera_key, dist_key, tuple(size))
+
+def undistort(image, camera_matrix, dist_coeffs):
+    """Undistort an image with cached maps instead of cv2.undistort"""
+    height, width = image.shape[:2]
+    map1, map2 = get_undistort_maps(camera_matrix, dist_coeffs, (width, height))
+    return cv2.remap(image, map1, map2, cv2.INTER_LINEAR)
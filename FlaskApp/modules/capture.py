@@ -0,0 +1,37 @@
+# modules/capture.py
+import threading
+import logging
+
+logger = logging.getLogger(__name__)
+
+class CaptureHandshake:
+    """Per-step events that let the scan loop wait for the phone's upload"""
+
+    def __init__(self):
+        self._events = {}
+        self._lock = threading.Lock()
+
+    def expect(self, step):
+        """Register a pending capture for a step"""
+        with self._lock:
+            self._events[step] = threading.Event()
+
+    def frame_received(self, step):
+        """Signal that the frame for a step has been saved"""
+        with self._lock:
+            event = self._events.get(step)
+        if event is not None:
+            event.set()
+
+    def wait(self, step, timeout):
+        """Wait for a step's frame; returns True if it arrived in time"""
+        with self._lock:
+            event = self._events.get(step)
+        if event is None:
+            return False
+        return event.wait(timeout)
+
+    def done(self, step):
+        """Forget a step once it has been captured or given up on"""
+        with self._lock:
+            self._events.pop(step, None)
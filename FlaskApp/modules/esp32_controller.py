@@ -1,21 +1,119 @@
 # modules/esp32_controller.py
+import time
+import asyncio
+import bisect
+import threading
 import requests
 import logging
-from config import ESP32_IP
-import cv2
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import NewConnectionError
+from config import ESP32_IP, ESP32_TIMEOUT, ESP32_RETRIES, ESP32_BACKOFF
 
 logger = logging.getLogger(__name__)
 
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, float("inf"))
+
+# Commands that move the motor must not be re-sent once the device may have received them
+NON_IDEMPOTENT_COMMANDS = ("/esp32/step", "/esp32/step360")
+
+def _failed_to_connect(error):
+    """True if a ConnectionError happened before the request was sent"""
+    if isinstance(error, requests.exceptions.ConnectTimeout):
+        return True
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, NewConnectionError)
+
+class ESP32Controller:
+    """Keep-alive HTTP client for the ESP32 with retries and per-command latency histograms"""
+
+    def __init__(self, host=ESP32_IP, timeout=ESP32_TIMEOUT, retries=ESP32_RETRIES, backoff=ESP32_BACKOFF):
+        self.host = host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.last_error = None
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4, max_retries=0)
+        self.session.mount("http://", adapter)
+
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _record(self, command, latency, ok):
+        with self._stats_lock:
+            stats = self._stats.setdefault(command, {
+                "count": 0,
+                "errors": 0,
+                "sum": 0.0,
+                "buckets": [0] * len(LATENCY_BUCKETS)
+            })
+            stats["count"] += 1
+            stats["sum"] += latency
+            stats["buckets"][bisect.bisect_left(LATENCY_BUCKETS, latency)] += 1
+            if not ok:
+                stats["errors"] += 1
+
+    def send(self, command, timeout=None):
+        """Send a command, returning the response text or None on failure"""
+        url = f"http://{self.host}{command}"
+        idempotent = command not in NON_IDEMPOTENT_COMMANDS
+
+        for attempt in range(self.retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, timeout=timeout or self.timeout)
+                response.raise_for_status()
+                self._record(command, time.perf_counter() - start, True)
+                self.last_error = None
+                return response.text
+            except requests.exceptions.ConnectionError as e:
+                # A connection dropped after the request was written may already have been acted on
+                error = e
+                retryable = idempotent or _failed_to_connect(e)
+            except requests.exceptions.Timeout as e:
+                error = e
+                retryable = idempotent
+            except Exception as e:
+                error = e
+                retryable = False
+
+            self._record(command, time.perf_counter() - start, False)
+            self.last_error = f"{type(error).__name__}: {error}"
+            if not retryable or attempt == self.retries:
+                break
+            time.sleep(self.backoff * (2 ** attempt))
+
+        logger.error(f"ESP32 command {command} failed: {self.last_error}")
+        return None
+
+    async def send_async(self, command, timeout=None):
+        """Asyncio interface: run send() without blocking the event loop"""
+        return await asyncio.to_thread(self.send, command, timeout)
+
+    def latency_stats(self):
+        """Return a copy of the per-command latency histograms"""
+        with self._stats_lock:
+            return {
+                command: {
+                    "count": stats["count"],
+                    "errors": stats["errors"],
+                    "sum": stats["sum"],
+                    "buckets": dict(zip(LATENCY_BUCKETS, stats["buckets"]))
+                }
+                for command, stats in self._stats.items()
+            }
+
+    def close(self):
+        self.session.close()
+
+# Shared controller so scan loops and health checks reuse one connection
+controller = ESP32Controller()
+
 def send_tcp_command(command):
     """Send HTTP command to ESP32"""
-    try:
-        url = f"http://{ESP32_IP}{command}"
-        response = requests.get(url, timeout=5)
-        response.raise_for_status()
-        return response.text
-    except Exception as e:
-        logger.error(f"Unexpected error: {e}")
-        return None
+    return controller.send(command)
 
 def esp32_laser_on():
     """Turn the laser on"""
@@ -25,10 +123,14 @@ def esp32_laser_off():
     """Turn the laser off"""
     return send_tcp_command("/esp32/laser-off")
 
+def esp32_step():
+    """Step the motor once"""
+    return send_tcp_command("/esp32/step")
+
 def esp32_step_motor():
     """Step the motor 360 degrees"""
     return send_tcp_command("/esp32/step360")
 
 def esp32_check_status():
     """Check ESP32 status"""
-    return send_tcp_command("/esp32/status")
\ No newline at end of file
+    return send_tcp_command("/esp32/status")
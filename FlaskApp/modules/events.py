@@ -0,0 +1,202 @@
+# modules/events.py
+import os
+import json
+import time
+import logging
+import threading
+from collections import deque
+
+from modules.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+# High-frequency progress events; only the newest per interval is kept
+COALESCED_STATUSES = ("processing", "image_processed", "queued")
+# Events after which a status stream ends
+TERMINAL_STATUSES = ("completed", "error", "cancelled", "finished")
+SUMMARY_FIELDS = ("total_images", "processed_images", "total_points", "ply_path")
+
+class EventLog:
+    """Bounded, sequenced log of one job's status events with coalesced progress updates"""
+
+    def __init__(self, scan_id, max_events=500, progress_interval=0.25):
+        self.scan_id = scan_id
+        self.progress_interval = progress_interval
+        self.started_at = time.time()
+        self.finished_at = None
+        self.done = False
+        self.latest = None
+        self.last_seq = 0
+        self._events = deque(maxlen=max_events)
+        self._deferred = {}
+        self._last_published = {}
+        self._summary = {"warnings": 0}
+        self._cond = threading.Condition()
+
+    def put(self, event):
+        """Publish a status event, coalescing frequent progress updates"""
+        with self._cond:
+            now = time.perf_counter()
+            status = event.get("status")
+            if status in COALESCED_STATUSES and now - self._last_published.get(status, float("-inf")) < self.progress_interval:
+                self._deferred[status] = event
+                self._flush(now, force=False)
+                return
+            self._flush(now, force=status not in COALESCED_STATUSES)
+            self._publish(event, now)
+
+    def _flush(self, now, force):
+        for status, event in list(self._deferred.items()):
+            if force or now - self._last_published[status] >= self.progress_interval:
+                del self._deferred[status]
+                self._publish(event, now)
+
+    def _publish(self, event, now):
+        self.last_seq += 1
+        self._events.append((self.last_seq, now, event))
+        self._last_published[event.get("status")] = now
+        self.latest = event
+
+        if event.get("status") == "warning":
+            self._summary["warnings"] += 1
+        for field in SUMMARY_FIELDS:
+            if field in event:
+                self._summary[field] = event[field]
+        self._cond.notify_all()
+
+    def close(self):
+        """Publish held-back events and mark the job finished"""
+        with self._cond:
+            self._flush(time.perf_counter(), force=True)
+            if self.latest is None or self.latest.get("status") not in TERMINAL_STATUSES:
+                self._publish({"status": "finished", "message": "Processing finished"}, time.perf_counter())
+            self.done = True
+            self.finished_at = time.time()
+            self._cond.notify_all()
+
+    def read(self, after_seq=0, timeout=None):
+        """Wait up to timeout for events after after_seq; returns (events, done)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self.last_seq > after_seq or self.done, timeout)
+            return [entry for entry in self._events if entry[0] > after_seq], self.done
+
+    def events(self):
+        """Return the buffered events, oldest first"""
+        with self._cond:
+            return [event for _, _, event in self._events]
+
+    def annotate(self, **fields):
+        """Add fields to the summary without publishing an event"""
+        with self._cond:
+            self._summary.update(fields)
+
+    def summary(self):
+        """Compact description of the job suitable for persisting"""
+        with self._cond:
+            return dict(self._summary,
+                        scan_id=self.scan_id,
+                        state="finished" if self.done else "active",
+                        started_at=self.started_at,
+                        finished_at=self.finished_at,
+                        events=self.last_seq,
+                        last_status=self.latest.get("status") if self.latest else None,
+                        message=self.latest.get("message") if self.latest else None)
+
+class EventLogRegistry:
+    """Event logs of active and recently finished processing jobs"""
+
+    def __init__(self, max_events=500, progress_interval=0.25, max_finished=20, retention=3600):
+        self.max_events = max_events
+        self.progress_interval = progress_interval
+        self.max_finished = max_finished
+        self.retention = retention
+        self._logs = {}
+        self._summary_paths = {}
+        # Finished logs replaced by a new one, restored if that one is discarded
+        self._replaced = {}
+        self._lock = threading.Lock()
+
+    def create(self, scan_id, summary_path=None):
+        """Start a new event log for a scan, replacing a finished one"""
+        with self._lock:
+            return self._create(scan_id, summary_path)
+
+    def create_if_idle(self, scan_id, summary_path=None):
+        """Like create, but return None if the scan already has a live log"""
+        with self._lock:
+            current = self._logs.get(scan_id)
+            if current is not None and not current.done:
+                return None
+            return self._create(scan_id, summary_path)
+
+    def _create(self, scan_id, summary_path):
+        self._evict()
+        previous = self._logs.get(scan_id)
+        if previous is not None and previous.done:
+            self._replaced[scan_id] = (previous, self._summary_paths.get(scan_id))
+        else:
+            self._replaced.pop(scan_id, None)
+        log = EventLog(scan_id, self.max_events, self.progress_interval)
+        self._logs[scan_id] = log
+        self._summary_paths[scan_id] = summary_path
+        return log
+
+    def get(self, scan_id):
+        with self._lock:
+            return self._logs.get(scan_id)
+
+    def is_active(self, scan_id):
+        log = self.get(scan_id)
+        return log is not None and not log.done
+
+    def finish(self, scan_id):
+        """Close a job's log, persist its summary and evict old jobs"""
+        with self._lock:
+            log = self._logs.get(scan_id)
+            summary_path = self._summary_paths.get(scan_id)
+            self._replaced.pop(scan_id, None)
+        if log is None:
+            return
+        log.close()
+        if summary_path and os.path.isdir(os.path.dirname(summary_path)):
+            try:
+                save_summary(summary_path, log.summary())
+            except OSError as e:
+                logger.error(f"Error saving processing summary for {scan_id}: {str(e)}")
+        with self._lock:
+            self._evict()
+
+    def discard(self, scan_id, log):
+        """Drop a log that never got a job, restoring the finished log it replaced"""
+        with self._lock:
+            if self._logs.get(scan_id) is not log:
+                return
+            replaced = self._replaced.pop(scan_id, None)
+            if replaced is not None:
+                self._logs[scan_id], self._summary_paths[scan_id] = replaced
+            else:
+                del self._logs[scan_id]
+                self._summary_paths.pop(scan_id, None)
+
+    def _evict(self):
+        finished = sorted((log.finished_at, scan_id) for scan_id, log in self._logs.items() if log.done)
+        cutoff = time.time() - self.retention
+        excess = len(finished) - self.max_finished
+        for index, (finished_at, scan_id) in enumerate(finished):
+            if finished_at < cutoff or index < excess:
+                del self._logs[scan_id]
+                self._summary_paths.pop(scan_id, None)
+                self._replaced.pop(scan_id, None)
+
+def save_summary(path, summary):
+    """Atomically write a job summary as JSON"""
+    with atomic_write(path, 'w') as f:
+        json.dump(summary, f, indent=2)
+
+def load_summary(path):
+    """Read a persisted job summary, or None if there is none"""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
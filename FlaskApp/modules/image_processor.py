@@ -2,9 +2,14 @@ import cv2
 import numpy as np
 import os
 import re
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from math import radians, cos, sin, tan
 from PIL import Image
+from modules.artifacts import artifact_enabled, save_artifact
+from modules.calibration import undistort
+from config import IMAGES_FOLDER
 
 logger = logging.getLogger(__name__)
 
@@ -20,74 +25,190 @@ def extract_metadata(filename):
     else:
         raise ValueError(f"Cannot extract metadata from filename: {filename}")
 
-def preprocess_and_extract_line(laser_on, laser_off, scan_dir, img_num, angle, camera_matrix=None, dist_coeffs=None):
+def sort_by_step(filenames):
+    """Sort image filenames by their numeric step rather than as strings"""
+    def key(filename):
+        match = re.search(r'image_(\d+)\.', filename)
+        return (0, int(match.group(1)), filename) if match else (1, 0, filename)
+    return sorted(filenames, key=key)
+
+# Gaussian blur applied to the background-subtracted frame
+BLUR_KERNEL = (5, 5)
+
+def preprocess_and_extract_line(laser_on, laser_off, scan_dir, img_num, angle, camera_matrix=None, dist_coeffs=None,
+                                artifact_level="full", artifact_writer=None, crop=None, crop_scale=1):
     """Preprocess images and extract laser line"""
-    # Create directories for intermediate results
-    gray_on_dir = os.path.join(scan_dir, 'Gray_on')
-    gray_off_dir = os.path.join(scan_dir, 'Gray_off')
-    diff_dir = os.path.join(scan_dir, 'difference')
-    blur_dir = os.path.join(scan_dir, 'blurred')
+    calibrated = camera_matrix is not None and dist_coeffs is not None
     
-    # Create folders if they don't exist
-    for directory in [gray_on_dir, gray_off_dir, diff_dir, blur_dir]:
-        os.makedirs(directory, exist_ok=True)
+    # Without undistortion the crop can be taken before any pixel work
+    if not calibrated:
+        laser_on = apply_crop(laser_on, crop, crop_scale)
+        laser_off = apply_crop(laser_off, crop, crop_scale)
+
+    save_intermediate = artifact_enabled(artifact_level, "full")
     
-    # Generate timestamp for filenames
-    timestamp = os.path.basename(scan_dir)
+    if save_intermediate:
+        # Create directories for intermediate results
+        gray_on_dir = os.path.join(scan_dir, 'Gray_on')
+        gray_off_dir = os.path.join(scan_dir, 'Gray_off')
+        diff_dir = os.path.join(scan_dir, 'difference')
+        blur_dir = os.path.join(scan_dir, 'blurred')
+        
+        # Create folders if they don't exist
+        for directory in [gray_on_dir, gray_off_dir, diff_dir, blur_dir]:
+            os.makedirs(directory, exist_ok=True)
+        
+        # Generate timestamp for filenames
+        timestamp = os.path.basename(scan_dir)
     
     # Convert to grayscale
     gray_on = cv2.cvtColor(laser_on, cv2.COLOR_BGR2GRAY)
     gray_off = cv2.cvtColor(laser_off, cv2.COLOR_BGR2GRAY)
     
     # Undistort if camera parameters are provided
-    if camera_matrix is not None and dist_coeffs is not None:
-        gray_on = cv2.undistort(gray_on, camera_matrix, dist_coeffs)
-        gray_off = cv2.undistort(gray_off, camera_matrix, dist_coeffs)
-    
-    # Save grayscale images
-    cv2.imwrite(os.path.join(gray_on_dir, f"{timestamp}_{img_num}_gray_on.png"), gray_on)
-    cv2.imwrite(os.path.join(gray_off_dir, f"{timestamp}_{img_num}_gray_off.png"), gray_off)
+    if calibrated:
+        gray_on = apply_crop(undistort(gray_on, camera_matrix, dist_coeffs), crop, crop_scale)
+        gray_off = apply_crop(undistort(gray_off, camera_matrix, dist_coeffs), crop, crop_scale)
     
     # Subtract background
     diff = cv2.subtract(gray_on, gray_off)
     
-    # Save difference image
-    cv2.imwrite(os.path.join(diff_dir, f"{timestamp}_diff.png"), diff)
-    
     # Apply Gaussian blur to reduce noise
-    processed_image = cv2.GaussianBlur(diff, (5, 5), 0)
+    processed_image = cv2.GaussianBlur(diff, BLUR_KERNEL, 0)
     
-    # Save blurred image
-    cv2.imwrite(os.path.join(blur_dir, f"{timestamp}_blurred.png"), processed_image)
+    # Save grayscale, difference and blurred images
+    if save_intermediate:
+        save_artifact(os.path.join(gray_on_dir, f"{timestamp}_{img_num}_gray_on.png"), gray_on, artifact_writer)
+        save_artifact(os.path.join(gray_off_dir, f"{timestamp}_{img_num}_gray_off.png"), gray_off, artifact_writer)
+        save_artifact(os.path.join(diff_dir, f"{timestamp}_{img_num}_diff.png"), diff, artifact_writer)
+        save_artifact(os.path.join(blur_dir, f"{timestamp}_{img_num}_blurred.png"), processed_image, artifact_writer)
     
     return processed_image, diff
 
-def extract_laser_points(processed_image):
+def extract_laser_points(processed_image, threshold=0, subpixel=None, window=BLUR_KERNEL[0]):
     """Extract 2D laser line points from the processed image"""
-    height, width = processed_image.shape
-    points = []
+    height = processed_image.shape[0]
+    rows = np.arange(height)
     
     # For each row, find the brightest point (laser line)
-    for y in range(height):
-        row = processed_image[y, :]
-        
-        # Skip empty rows
-        if np.max(row) == 0:
-            continue
-        
-        # Find the brightest point in this row
-        x = np.argmax(row)
-        
-        # Only include points that have some brightness
-        if row[x] > 0:
-            points.append((x, y))
+    xs = np.argmax(processed_image, axis=1)
+    peaks = processed_image[rows, xs]
+    
+    # Only include rows that have some brightness
+    valid = peaks > threshold
+    ys = rows[valid]
+    xs = xs[valid]
+    
+    if subpixel is None:
+        return np.column_stack((xs, ys))
     
-    return np.array(points)
+    if subpixel == "centroid":
+        xs = _centroid_peaks(processed_image, xs, ys, window)
+    elif subpixel == "parabolic":
+        xs = _parabolic_peaks(processed_image, xs, ys)
+    else:
+        raise ValueError(f"Unknown subpixel mode: {subpixel}")
+    
+    return np.column_stack((xs, ys.astype(np.float32)))
 
-def crop_images(scan_id, crop_coords, base_dir="C:/Users/shiva/OneDrive/Desktop/Programs/Projects/3DScanner/FlaskApp/scan_images"):
+def _centroid_peaks(image, xs, ys, window):
+    """Refine peaks to the intensity-weighted centroid of a window around them"""
+    width = image.shape[1]
+    offsets = np.arange(-window, window + 1)
+    cols = xs[:, None] + offsets[None, :]
+    inside = (cols >= 0) & (cols < width)
+    cols = np.clip(cols, 0, width - 1)
+    
+    weights = image[ys[:, None], cols].astype(np.float32)
+    # Without the background under the line, the window's cut-off tails pull the centroid towards its centre
+    weights -= weights.min(axis=1, keepdims=True)
+    total = weights.sum(axis=1)
+    
+    # Flat windows and windows cut by the image border would be biased; keep the integer peak there
+    unrefined = (total == 0) | ~inside.all(axis=1)
+    total[unrefined] = 1
+    refined = (weights * cols).sum(axis=1) / total
+    refined[unrefined] = xs[unrefined]
+    return refined.astype(np.float32)
+
+def _parabolic_peaks(image, xs, ys):
+    """Refine peaks by fitting a parabola through the peak and its neighbours"""
+    width = image.shape[1]
+    refined = xs.astype(np.float32)
+    
+    # Peaks on the image border have no neighbour on one side
+    inner = (xs > 0) & (xs < width - 1)
+    x = xs[inner]
+    y = ys[inner]
+    left = image[y, x - 1].astype(np.float32)
+    center = image[y, x].astype(np.float32)
+    right = image[y, x + 1].astype(np.float32)
+    
+    denom = left - 2 * center + right
+    offset = np.zeros_like(denom)
+    curved = denom != 0
+    offset[curved] = 0.5 * (left[curved] - right[curved]) / denom[curved]
+    
+    refined[inner] += np.clip(offset, -0.5, 0.5)
+    return refined
+
+# Crop rectangle stored with the scan and applied as a view at processing time
+CROP_FILE = "crop.json"
+
+# cv2.imread flags for JPEG reduced-resolution decoding
+_REDUCED_READ_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8
+}
+
+def save_crop(scan_dir, crop_coords):
+    """Store the crop rectangle as scan metadata"""
+    crop = {k: int(crop_coords[k]) for k in ('x', 'y', 'width', 'height')}
+    if crop['width'] <= 0 or crop['height'] <= 0:
+        raise ValueError("Crop width and height must be positive")
+    with open(os.path.join(scan_dir, CROP_FILE), 'w') as f:
+        json.dump(crop, f)
+    return crop
+
+def load_crop(scan_dir):
+    """Load the scan's crop rectangle, or None if it is not cropped"""
+    path = os.path.join(scan_dir, CROP_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def apply_crop(image, crop, scale=1):
+    """Return a view of the crop rectangle, scaled for reduced decoding"""
+    if crop is None:
+        return image
+    x = max(crop['x'] // scale, 0)
+    y = max(crop['y'] // scale, 0)
+    return image[y:y + crop['height'] // scale, x:x + crop['width'] // scale]
+
+def read_frame(path, scale=1, data=None):
+    """Decode an image from path or in-memory data, at reduced size when scale is 2, 4 or 8"""
+    if scale not in _REDUCED_READ_FLAGS:
+        raise ValueError(f"Unsupported decode scale: {scale}")
+    if data is not None:
+        return cv2.imdecode(np.frombuffer(data, np.uint8), _REDUCED_READ_FLAGS[scale])
+    return cv2.imread(path, _REDUCED_READ_FLAGS[scale])
+
+def _crop_file(src_path, dst_path, box):
+    img = Image.open(src_path)
+    img.crop(box).save(dst_path)
+
+def crop_images(scan_id, crop_coords, base_dir=IMAGES_FOLDER, materialize=False, workers=None):
     """Apply cropping to all images in a scan"""
     try:
         scan_dir = os.path.join(base_dir, scan_id)
+        crop = save_crop(scan_dir, crop_coords)
+        
+        if not materialize:
+            return {"success": True, "message": f"Saved crop {crop['width']}x{crop['height']} at ({crop['x']}, {crop['y']}) for {scan_id}"}
+        
         laser_on_dir = os.path.join(scan_dir, "laser_on")
         laser_off_dir = os.path.join(scan_dir, "laser_off")
         cropped_dir = os.path.join(scan_dir, "cropped")
@@ -96,30 +217,18 @@ def crop_images(scan_id, crop_coords, base_dir="C:/Users/shiva/OneDrive/Desktop/
         os.makedirs(os.path.join(cropped_dir, "laser_on"), exist_ok=True)
         os.makedirs(os.path.join(cropped_dir, "laser_off"), exist_ok=True)
         
-        # Extract crop coordinates
-        x = int(crop_coords['x'])
-        y = int(crop_coords['y'])
-        width = int(crop_coords['width'])
-        height = int(crop_coords['height'])
-        
-        # Process laser-on images
-        laser_on_files = sorted([f for f in os.listdir(laser_on_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        for img_file in laser_on_files:
-            img_path = os.path.join(laser_on_dir, img_file)
-            img = Image.open(img_path)
-            cropped_img = img.crop((x, y, x + width, y + height))
-            cropped_img.save(os.path.join(cropped_dir, "laser_on", img_file))
+        box = (crop['x'], crop['y'], crop['x'] + crop['width'], crop['y'] + crop['height'])
+        tasks = []
+        for mode, mode_dir in (("laser_on", laser_on_dir), ("laser_off", laser_off_dir)):
+            for img_file in sorted([f for f in os.listdir(mode_dir) if f.endswith(('.jpg', '.jpeg', '.png'))]):
+                tasks.append((os.path.join(mode_dir, img_file), os.path.join(cropped_dir, mode, img_file), box))
         
-        # Process laser-off images
-        laser_off_files = sorted([f for f in os.listdir(laser_off_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
-        for img_file in laser_off_files:
-            img_path = os.path.join(laser_off_dir, img_file)
-            img = Image.open(img_path)
-            cropped_img = img.crop((x, y, x + width, y + height))
-            cropped_img.save(os.path.join(cropped_dir, "laser_off", img_file))
+        # Decoding and encoding release the GIL, so threads scale across cores
+        with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+            list(executor.map(lambda task: _crop_file(*task), tasks))
         
-        return {"success": True, "message": f"Applied cropping to {len(laser_on_files) + len(laser_off_files)} images"}
+        return {"success": True, "message": f"Applied cropping to {len(tasks)} images"}
     
     except Exception as e:
         logger.error(f"Error cropping images: {str(e)}")
-        return {"success": False, "message": f"Error cropping images: {str(e)}"}
\ No newline at end of file
+        return {"success": False, "message": f"Error cropping images: {str(e)}"}
@@ -0,0 +1,200 @@
+# modules/job_queue.py
+import json
+import time
+import sqlite3
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+FINISHED_STATES = ("completed", "failed", "cancelled")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    scan_id TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    state TEXT NOT NULL DEFAULT 'queued',
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    submitted_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL,
+    resources TEXT
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_id INTEGER NOT NULL,
+    event TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, priority, id);
+CREATE INDEX IF NOT EXISTS events_job ON events (job_id);
+"""
+
+def _job(row):
+    if row is None:
+        return None
+    job = dict(row)
+    job["resources"] = json.loads(job["resources"]) if job["resources"] else None
+    return job
+
+class JobQueue:
+    """Durable SQLite processing queue shared by the web process and workers"""
+
+    def __init__(self, path, max_attempts=3):
+        self.path = path
+        self.max_attempts = max_attempts
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except Exception:
+                db.execute("ROLLBACK")
+                raise
+
+    def submit(self, scan_id, priority=0):
+        """Queue a scan for processing and return the job id"""
+        with self._transaction() as db:
+            cursor = db.execute("INSERT INTO jobs (scan_id, priority, submitted_at) VALUES (?, ?, ?)",
+                                (scan_id, priority, time.time()))
+            return cursor.lastrowid
+
+    def claim(self, worker, lease_seconds):
+        """Lease the next job to a worker, or return None when there is nothing to do"""
+        now = time.time()
+        with self._transaction() as db:
+            expired = db.execute("SELECT id FROM jobs WHERE state = 'running' AND lease_until < ? AND attempts >= ?",
+                                 (now, self.max_attempts)).fetchall()
+            for row in expired:
+                self._finish(db, row["id"], "failed", None, now)
+                self._add_event(db, row["id"], {"status": "error", "message": f"Processing failed after {self.max_attempts} worker attempts"})
+
+            row = db.execute("""SELECT * FROM jobs
+                                WHERE state = 'queued' OR (state = 'running' AND lease_until < ?)
+                                ORDER BY priority DESC, id LIMIT 1""", (now,)).fetchone()
+            if row is None:
+                return None
+            db.execute("""UPDATE jobs SET state = 'running', worker = ?, lease_until = ?, attempts = attempts + 1,
+                          started_at = COALESCE(started_at, ?) WHERE id = ?""",
+                       (worker, now + lease_seconds, now, row["id"]))
+            if row["state"] == "running":
+                logger.warning(f"Reclaiming job {row['id']} ({row['scan_id']}) from worker {row['worker']}")
+            return _job(db.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone())
+
+    def renew(self, job_id, worker, lease_seconds):
+        """Extend a worker's lease; returns False once the job was reclaimed or finished"""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_until = ? WHERE id = ? AND worker = ? AND state = 'running'",
+                                (time.time() + lease_seconds, job_id, worker))
+            return cursor.rowcount == 1
+
+    def cancel_requested(self, job_id):
+        with self._connect() as db:
+            row = db.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(row and row["cancel_requested"])
+
+    def add_event(self, job_id, event, worker=None):
+        """Append a status event; with ``worker``, only while that worker holds the job"""
+        with self._transaction() as db:
+            if worker is not None and not self._holds(db, job_id, worker):
+                return False
+            self._add_event(db, job_id, event)
+            return True
+
+    def _add_event(self, db, job_id, event):
+        db.execute("INSERT INTO events (job_id, event) VALUES (?, ?)", (job_id, json.dumps(event)))
+
+    def _holds(self, db, job_id, worker):
+        return db.execute("SELECT 1 FROM jobs WHERE id = ? AND worker = ? AND state = 'running'",
+                          (job_id, worker)).fetchone() is not None
+
+    def finish(self, job_id, state, resources=None, worker=None):
+        """Record a job's final state; with ``worker``, only while that worker holds the job"""
+        with self._transaction() as db:
+            if worker is not None and not self._holds(db, job_id, worker):
+                return False
+            self._finish(db, job_id, state, resources, time.time())
+            return True
+
+    def _finish(self, db, job_id, state, resources, now):
+        db.execute("UPDATE jobs SET state = ?, finished_at = ?, lease_until = NULL, resources = ? WHERE id = ?",
+                   (state, now, json.dumps(resources) if resources is not None else None, job_id))
+
+    def cancel(self, scan_id):
+        """Cancel the scan's queued job or flag its running one; returns the job's state or None"""
+        with self._transaction() as db:
+            row = db.execute("SELECT * FROM jobs WHERE scan_id = ? AND state IN ('queued', 'running') ORDER BY id DESC LIMIT 1",
+                             (scan_id,)).fetchone()
+            if row is None:
+                return None
+            if row["state"] == "running":
+                db.execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ?", (row["id"],))
+                return "running"
+            self._finish(db, row["id"], "cancelled", None, time.time())
+            self._add_event(db, row["id"], {"status": "cancelled", "message": "Processing cancelled before it started"})
+            return "queued"
+
+    def get(self, job_id):
+        with self._connect() as db:
+            return _job(db.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+    def jobs(self, states=("queued", "running")):
+        """Jobs in the given states, running first, then in the order they will start"""
+        placeholders = ",".join("?" * len(states))
+        with self._connect() as db:
+            rows = db.execute(f"""SELECT * FROM jobs WHERE state IN ({placeholders})
+                                  ORDER BY state = 'queued', priority DESC, id""", states).fetchall()
+        return [_job(row) for row in rows]
+
+    def jobs_after(self, job_id):
+        """Jobs submitted after job_id, in any state, oldest first"""
+        with self._connect() as db:
+            rows = db.execute("SELECT * FROM jobs WHERE id > ? ORDER BY id", (job_id,)).fetchall()
+        return [_job(row) for row in rows]
+
+    def last_job_id(self):
+        with self._connect() as db:
+            return db.execute("SELECT COALESCE(MAX(id), 0) FROM jobs").fetchone()[0]
+
+    def queued_count(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM jobs WHERE state = 'queued'").fetchone()[0]
+
+    def events_after(self, seq, job_ids=None, limit=1000):
+        """(seq, job_id, event) for events after seq, optionally only of job_ids"""
+        query = "SELECT seq, job_id, event FROM events WHERE seq > ?"
+        params = [seq]
+        if job_ids is not None:
+            if not job_ids:
+                return []
+            query += f" AND job_id IN ({','.join('?' * len(job_ids))})"
+            params += list(job_ids)
+        with self._connect() as db:
+            rows = db.execute(query + " ORDER BY seq LIMIT ?", params + [limit]).fetchall()
+        return [(row["seq"], row["job_id"], json.loads(row["event"])) for row in rows]
+
+    def prune(self, retention):
+        """Delete finished jobs, and their events, older than retention seconds"""
+        cutoff = time.time() - retention
+        with self._transaction() as db:
+            db.execute("""DELETE FROM events WHERE job_id IN
+                          (SELECT id FROM jobs WHERE state IN ('completed', 'failed', 'cancelled') AND finished_at < ?)""", (cutoff,))
+            db.execute("DELETE FROM jobs WHERE state IN ('completed', 'failed', 'cancelled') AND finished_at < ?", (cutoff,))
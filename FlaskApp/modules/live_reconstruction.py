@@ -0,0 +1,140 @@
+# modules/live_reconstruction.py
+import os
+import time
+import queue
+import logging
+import datetime
+import threading
+
+from modules.pipeline import process_image_pair
+from modules.point_cloud import PlyWriter, load_ply, STEPS_PER_REVOLUTION
+from modules.tiles import build_tiles, TILES_DIR
+from modules.calibration import load_calibration
+from modules.metrics import StageMetrics, global_metrics, format_summary
+
+logger = logging.getLogger(__name__)
+
+class LiveReconstructor:
+    """Reconstruct a scan incrementally while it is still being captured"""
+
+    # Decode the frame that completes a pair from the upload's bytes
+    wants_frame_data = True
+
+    def __init__(self, scan_dir, emit, threshold=0, subpixel=None, artifact_level="summary", ply_format="binary_little_endian",
+                 tile_max_points=None):
+        self.scan_dir = scan_dir
+        self.scan_id = os.path.basename(scan_dir)
+        self.processed_dir = os.path.join(scan_dir, "processed")
+        self.ply_path = os.path.join(self.processed_dir, "reconstructed_model.ply")
+        self.emit = emit
+        self.options = (threshold, subpixel, artifact_level) + load_calibration(scan_dir)
+        # Viewer tiles are built by finish(); None skips them
+        self.tile_max_points = tile_max_points
+        self.pairs_processed = 0
+        self.metrics = StageMetrics()
+
+        os.makedirs(self.processed_dir, exist_ok=True)
+        self._writer = PlyWriter(self.ply_path, ply_format)
+        self._frames = {"laser_on": {}, "laser_off": {}}
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def add_frame(self, step, mode, path, data=None):
+        """Register an uploaded frame and queue its pair once both halves exist"""
+        if mode not in self._frames:
+            return
+        step = int(step)
+        on_step = step if mode == "laser_on" else step - STEPS_PER_REVOLUTION
+
+        with self._lock:
+            self._frames[mode][step] = path
+            on_path = self._frames["laser_on"].pop(on_step, None)
+            off_path = self._frames["laser_off"].pop(on_step + STEPS_PER_REVOLUTION, None)
+            if on_path is None or off_path is None:
+                # Partner has not arrived yet, keep whichever half we have
+                if on_path is not None:
+                    self._frames["laser_on"][on_step] = on_path
+                if off_path is not None:
+                    self._frames["laser_off"][on_step + STEPS_PER_REVOLUTION] = off_path
+                return
+
+        frame_data = (data, None) if mode == "laser_on" else (None, data)
+        self._queue.put((on_path, off_path, frame_data))
+
+    def _run(self):
+        while True:
+            pair = self._queue.get()
+            if pair is None:
+                break
+            on_path, off_path, frame_data = pair
+            try:
+                result = process_image_pair(self.scan_dir, self.processed_dir, on_path, off_path, *self.options,
+                                            frame_data=frame_data)
+            except Exception as e:
+                logger.error(f"Live reconstruction failed for {on_path}: {str(e)}")
+                self.emit('log_message', {'message': f"Live reconstruction failed for {os.path.basename(on_path)}: {str(e)}"})
+                continue
+
+            points_3d = result["points_3d"]
+            start = time.perf_counter()
+            self._writer.write(points_3d)
+            self._writer.flush()
+            result["timings"]["ply_write"] = time.perf_counter() - start
+            self.pairs_processed += 1
+            for registry in (self.metrics, global_metrics):
+                registry.merge(result["timings"])
+
+            self.emit('live_points', {
+                'scan_id': self.scan_id,
+                'angle': result["angle"],
+                'points': points_3d.tobytes(),
+                'total_points': self._writer.count,
+                'pairs_processed': self.pairs_processed
+            })
+
+    def finish(self):
+        """Process every queued pair, finalize the PLY and report the result"""
+        self._queue.put(None)
+        self._thread.join()
+        self._writer.close()
+
+        with self._lock:
+            unpaired = len(self._frames["laser_on"]) + len(self._frames["laser_off"])
+
+        total_points = self._writer.count
+        # Level-of-detail tiles for the model viewer, as after offline processing
+        if total_points and self.tile_max_points:
+            start = time.perf_counter()
+            try:
+                tile_index = build_tiles(load_ply(self.ply_path), os.path.join(self.processed_dir, TILES_DIR), self.tile_max_points)
+                for registry in (self.metrics, global_metrics):
+                    registry.observe("tiles", time.perf_counter() - start)
+                self.emit('log_message', {'message': f"Built {len(tile_index['nodes'])} viewer tiles"})
+            except Exception as e:
+                logger.error(f"Building viewer tiles for {self.scan_id} failed: {str(e)}")
+                self.emit('log_message', {'message': f"Building viewer tiles failed: {str(e)}"})
+
+        timings = self.metrics.summary()
+        if total_points:
+            with open(os.path.join(self.processed_dir, "processing_info.txt"), 'w') as f:
+                f.write(f"Processed on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"Total points: {total_points}\n")
+                f.write(f"Total images processed: {self.pairs_processed}\n")
+                f.write("Mode: live\n")
+                f.write("Stage timings:\n")
+                f.write("".join(line + "\n" for line in format_summary(timings)))
+        else:
+            os.remove(self.ply_path)
+
+        self.emit('live_reconstruction_completed', {
+            'scan_id': self.scan_id,
+            'total_points': total_points,
+            'pairs_processed': self.pairs_processed,
+            'unpaired_frames': unpaired,
+            'ply_path': self.ply_path,
+            'timings': timings
+        })
+        return total_points
@@ -0,0 +1,100 @@
+# modules/mesh.py
+import numpy as np
+
+MESH_FORMATS = ("ply", "obj")
+
+# Triangles longer than this multiple of the median edge are treated as gaps
+AUTO_EDGE_FACTOR = 4.0
+
+class OrganizedGrid:
+    """Scan points kept in their natural (angle index x image row) layout"""
+
+    def __init__(self, angles, rows):
+        self.points = np.zeros((angles, rows, 3), dtype=np.float32)
+        self.valid = np.zeros((angles, rows), dtype=bool)
+
+    @property
+    def shape(self):
+        return self.valid.shape
+
+    def set_angle(self, angle_index, rows, points_3d):
+        """Store one angle's points at their image rows"""
+        rows = np.asarray(rows, dtype=np.intp)
+        inside = (rows >= 0) & (rows < self.valid.shape[1])
+        self.points[angle_index, rows[inside]] = points_3d[inside]
+        self.valid[angle_index, rows[inside]] = True
+
+def triangulate_grid(points, valid, close_loop=False, max_edge=None):
+    """Triangulate an organized grid into (vertices, faces) in a single vectorized pass"""
+    angles, rows = valid.shape
+    index = np.full(valid.shape, -1, dtype=np.int64)
+    index[valid] = np.arange(np.count_nonzero(valid))
+    vertices = np.ascontiguousarray(points[valid], dtype=np.float32)
+    if angles < 2 or rows < 2:
+        return vertices, np.empty((0, 3), dtype=np.int32)
+
+    a0 = np.arange(angles if close_loop else angles - 1)
+    a1 = (a0 + 1) % angles
+
+    # Quad corners, named by (angle offset, row offset)
+    v00, v10 = index[a0, :-1], index[a1, :-1]
+    v01, v11 = index[a0, 1:], index[a1, 1:]
+    ok00, ok10, ok01, ok11 = v00 >= 0, v10 >= 0, v01 >= 0, v11 >= 0
+
+    # All candidates share the same winding in (angle, row) space
+    candidates = (
+        ((v00, v10, v11), ok00 & ok10 & ok11),
+        ((v00, v11, v01), ok00 & ok11 & ok01),
+        ((v10, v11, v01), ok10 & ok11 & ok01 & ~ok00),
+        ((v00, v10, v01), ok00 & ok10 & ok01 & ~ok11),
+    )
+    faces = np.concatenate([np.column_stack([corner[mask] for corner in corners])
+                            for corners, mask in candidates])
+    if len(faces) == 0:
+        return vertices, np.empty((0, 3), dtype=np.int32)
+
+    corners = vertices[faces]
+    edges = np.stack([np.linalg.norm(corners[:, i] - corners[:, (i + 1) % 3], axis=1) for i in range(3)], axis=1)
+    longest = edges.max(axis=1)
+    if max_edge is None:
+        max_edge = AUTO_EDGE_FACTOR * float(np.median(edges))
+    faces = faces[longest <= max_edge]
+    return vertices, faces.astype(np.int32)
+
+def save_mesh_ply(vertices, faces, output_file):
+    """Write a binary little-endian PLY mesh"""
+    vertices = np.ascontiguousarray(vertices, dtype='<f4').reshape(-1, 3)
+    face_records = np.empty(len(faces), dtype=[("count", "u1"), ("indices", "<i4", (3,))])
+    face_records["count"] = 3
+    face_records["indices"] = faces
+
+    with open(output_file, 'wb') as f:
+        f.write(b"ply\n")
+        f.write(b"format binary_little_endian 1.0\n")
+        f.write(f"element vertex {len(vertices)}\n".encode())
+        f.write(b"property float x\n")
+        f.write(b"property float y\n")
+        f.write(b"property float z\n")
+        f.write(f"element face {len(faces)}\n".encode())
+        f.write(b"property list uchar int vertex_indices\n")
+        f.write(b"end_header\n")
+        f.write(memoryview(vertices).cast('B'))
+        f.write(face_records.tobytes())
+
+    return f"Saved mesh with {len(vertices)} vertices and {len(faces)} faces to {output_file}"
+
+def save_mesh_obj(vertices, faces, output_file):
+    """Write a Wavefront OBJ mesh (OBJ has no binary form; indices are 1-based)"""
+    with open(output_file, 'wb') as f:
+        np.savetxt(f, vertices, fmt='v %.6g %.6g %.6g')
+        np.savetxt(f, np.asarray(faces, dtype=np.int64) + 1, fmt='f %d %d %d')
+
+    return f"Saved mesh with {len(vertices)} vertices and {len(faces)} faces to {output_file}"
+
+def save_mesh(vertices, faces, output_file, fmt="ply"):
+    """Save a triangle mesh as binary PLY or OBJ"""
+    if fmt == "ply":
+        return save_mesh_ply(vertices, faces, output_file)
+    if fmt == "obj":
+        return save_mesh_obj(vertices, faces, output_file)
+    raise ValueError(f"Unsupported mesh format: {fmt}")
@@ -0,0 +1,136 @@
+# modules/metrics.py
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+class StageMetrics:
+    """Durations per named stage plus simple counters"""
+
+    def __init__(self, max_samples=4096):
+        self.max_samples = max_samples
+        self._stages = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        """Record one duration for a stage"""
+        with self._lock:
+            entry = self._stages.get(stage)
+            if entry is None:
+                entry = self._stages[stage] = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+            entry["count"] += 1
+            entry["total"] += seconds
+            entry["samples"].append(seconds)
+
+    def merge(self, timings):
+        """Record a {stage: seconds} dict, e.g. returned by a pool worker"""
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    @contextmanager
+    def time(self, stage):
+        """Time the body of a with-block as one observation of a stage"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def drain(self):
+        """Return and clear everything recorded so far, for another process to absorb"""
+        with self._lock:
+            stages = {stage: {"count": entry["count"], "total": entry["total"], "samples": list(entry["samples"])}
+                      for stage, entry in self._stages.items()}
+            counters = self._counters
+            self._stages = {}
+            self._counters = {}
+        return {"stages": stages, "counters": counters}
+
+    def absorb(self, drained):
+        """Add the output of another registry's drain()"""
+        with self._lock:
+            for stage, other in drained["stages"].items():
+                entry = self._stages.get(stage)
+                if entry is None:
+                    entry = self._stages[stage] = {"count": 0, "total": 0.0, "samples": deque(maxlen=self.max_samples)}
+                entry["count"] += other["count"]
+                entry["total"] += other["total"]
+                entry["samples"].extend(other["samples"])
+            for counter, value in drained["counters"].items():
+                self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def increment(self, counter, value=1):
+        with self._lock:
+            self._counters[counter] = self._counters.get(counter, 0) + value
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def summary(self):
+        """Return {stage: {count, total, p50, p95}} with times in seconds"""
+        with self._lock:
+            stages = {stage: (entry["count"], entry["total"], sorted(entry["samples"]))
+                      for stage, entry in self._stages.items()}
+        return {
+            stage: {
+                "count": count,
+                "total": total,
+                "p50": _quantile(samples, 0.5),
+                "p95": _quantile(samples, 0.95)
+            }
+            for stage, (count, total, samples) in stages.items()
+        }
+
+def _quantile(sorted_samples, q):
+    if not sorted_samples:
+        return 0.0
+    return sorted_samples[min(int(q * len(sorted_samples)), len(sorted_samples) - 1)]
+
+def format_summary(summary):
+    """Render a stage summary as indented text lines for processing_info.txt"""
+    return [f"  {stage}: count={s['count']}, total={s['total']:.3f}s, "
+            f"p50={s['p50'] * 1000:.1f}ms, p95={s['p95'] * 1000:.1f}ms"
+            for stage, s in sorted(summary.items())]
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus(metrics, esp32_stats=None, prefix="scanner"):
+    """Render stage summaries, counters and ESP32 latency histograms as Prometheus text"""
+    lines = [
+        f"# HELP {prefix}_stage_seconds Time spent in each processing and capture stage",
+        f"# TYPE {prefix}_stage_seconds summary"
+    ]
+    for stage, s in sorted(metrics.summary().items()):
+        label = f'stage="{_escape(stage)}"'
+        lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.5"}} {s["p50"]}')
+        lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.95"}} {s["p95"]}')
+        lines.append(f'{prefix}_stage_seconds_sum{{{label}}} {s["total"]}')
+        lines.append(f'{prefix}_stage_seconds_count{{{label}}} {s["count"]}')
+
+    for counter, value in sorted(metrics.counters().items()):
+        lines.append(f"# TYPE {prefix}_{counter} counter")
+        lines.append(f"{prefix}_{counter} {value}")
+
+    if esp32_stats:
+        lines.append(f"# HELP {prefix}_esp32_command_seconds Latency of HTTP commands sent to the ESP32")
+        lines.append(f"# TYPE {prefix}_esp32_command_seconds histogram")
+        for command, stats in sorted(esp32_stats.items()):
+            label = f'command="{_escape(command)}"'
+            cumulative = 0
+            for bound, count in stats["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f'{prefix}_esp32_command_seconds_bucket{{{label},le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_esp32_command_seconds_sum{{{label}}} {stats["sum"]}')
+            lines.append(f'{prefix}_esp32_command_seconds_count{{{label}}} {stats["count"]}')
+        lines.append(f"# TYPE {prefix}_esp32_command_errors_total counter")
+        for command, stats in sorted(esp32_stats.items()):
+            lines.append(f'{prefix}_esp32_command_errors_total{{command="{_escape(command)}"}} {stats["errors"]}')
+
+    return "\n".join(lines) + "\n"
+
+# Process-wide metrics shared by processing, capture and the /metrics route
+global_metrics = StageMetrics()
@@ -0,0 +1,176 @@
+# modules/pipeline.py
+import os
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import cv2
+import numpy as np
+
+from modules.image_processor import extract_metadata, preprocess_and_extract_line, extract_laser_points, apply_crop, read_frame, BLUR_KERNEL
+from modules.point_cloud import convert_to_3d
+from modules.artifacts import ArtifactWriter, artifact_enabled, init_worker_writer, save_artifact, worker_writer
+from modules.stage_cache import StageCache, frame_signature, stage_key
+
+logger = logging.getLogger(__name__)
+
+def process_image_pair(scan_dir, processed_dir, laser_on_path, laser_off_path, threshold=0, subpixel=None,
+                       artifact_level="summary", camera_matrix=None, dist_coeffs=None, crop=None, decode_scale=1,
+                       cache_dir=None, cache_stages=("lines",), artifact_writer=None, frame_data=(None, None)):
+    """Run one laser-on/laser-off pair through extraction and triangulation"""
+    if artifact_writer is None:
+        artifact_writer = worker_writer()
+    
+    timings = {}
+    clock = time.perf_counter()
+    
+    def lap(stage):
+        nonlocal clock
+        now = time.perf_counter()
+        timings[stage] = now - clock
+        clock = now
+
+    on_file = os.path.basename(laser_on_path)
+    off_file = os.path.basename(laser_off_path)
+
+    # Extract image number and calculate angle
+    img_num, angle = extract_metadata(on_file)
+
+    cache = StageCache(cache_dir) if cache_dir and cache_stages else None
+    # The "full" level saves every intermediate image, so those runs always recompute
+    read_cache = cache is not None and not artifact_enabled(artifact_level, "full")
+    cached_stages = []
+    if cache is not None:
+        # Keyed on file stats, so a fully cached pair never reads its frames
+        signatures = [frame_signature(path) for path in (laser_on_path, laser_off_path)]
+        preprocess_key = stage_key("preprocess", signatures, crop, decode_scale, camera_matrix, dist_coeffs, BLUR_KERNEL)
+        lines_key = stage_key("lines", preprocess_key, threshold, subpixel)
+        lap("cache_key")
+
+    laser_on = None
+    processed_image = None
+    cached = cache.get(lines_key) if read_cache and "lines" in cache_stages else None
+    if cached is not None:
+        points_2d = cached["points_2d"]
+        height, width = (int(n) for n in cached["shape"])
+        cached_stages.append("lines")
+        lap("extract")
+    else:
+        cached = cache.get(preprocess_key) if read_cache and "preprocess" in cache_stages else None
+        if cached is not None:
+            processed_image = cached["image"]
+            cached_stages.append("preprocess")
+        else:
+            # Load images
+            laser_on = read_frame(laser_on_path, decode_scale, frame_data[0])
+            laser_off = read_frame(laser_off_path, decode_scale, frame_data[1])
+
+            if laser_on is None or laser_off is None:
+                raise IOError(f"Could not read images: {on_file} or {off_file}")
+            lap("decode")
+
+            # Intrinsics are in full-resolution pixels
+            scaled_matrix = camera_matrix
+            if camera_matrix is not None and decode_scale != 1:
+                scaled_matrix = np.array(camera_matrix, dtype=np.float64)
+                scaled_matrix[:2] /= decode_scale
+
+            # Process images
+            processed_image, diff = preprocess_and_extract_line(laser_on, laser_off, scan_dir, img_num, angle,
+                                                                scaled_matrix, dist_coeffs,
+                                                                artifact_level=artifact_level, artifact_writer=artifact_writer,
+                                                                crop=crop, crop_scale=decode_scale)
+            if cache is not None and "preprocess" in cache_stages:
+                cache.put(preprocess_key, image=processed_image)
+        lap("preprocess")
+
+        # Get image dimensions of the (cropped) frame
+        height, width = processed_image.shape[:2]
+
+        # Extract 2D points
+        points_2d = extract_laser_points(processed_image, threshold=threshold, subpixel=subpixel)
+        if cache is not None and "lines" in cache_stages:
+            cache.put(lines_key, points_2d=points_2d, shape=np.array([height, width]))
+        lap("extract")
+
+    # Convert to 3D
+    points_3d = convert_to_3d(points_2d, angle, width, height, img_num)
+    lap("triangulate")
+
+    result = {
+        "img_num": img_num,
+        "angle": angle,
+        "points_3d": points_3d,
+        "points_detected": len(points_2d),
+        "rows": np.rint(points_2d[:, 1]).astype(np.int32),
+        "image_height": height,
+        "processed_image_path": None,
+        "visualization_path": None,
+        "cached_stages": cached_stages,
+        "timings": timings
+    }
+
+    # Save intermediate results
+    if len(points_2d) > 0 and artifact_enabled(artifact_level, "summary"):
+        processed_path = os.path.join(processed_dir, f"processed_angle_{angle:.1f}.jpg")
+        vis_path = os.path.join(processed_dir, f"detected_line_angle_{angle:.1f}.jpg")
+
+        if processed_image is None:
+            # The line came from the cache; keep the images saved when it was computed
+            if os.path.exists(processed_path) and os.path.exists(vis_path):
+                result["processed_image_path"] = processed_path
+                result["visualization_path"] = vis_path
+            return result
+
+        # Save processed image
+        save_artifact(processed_path, processed_image, artifact_writer)
+
+        # Visualize laser line on original image with a single pixel assignment
+        if laser_on is None:
+            laser_on = read_frame(laser_on_path, decode_scale, frame_data[0])
+        vis_img = apply_crop(laser_on, crop, decode_scale).copy()
+        xs = np.rint(points_2d[:, 0]).astype(np.intp)
+        ys = np.rint(points_2d[:, 1]).astype(np.intp)
+        vis_img[ys, np.clip(xs, 0, width - 1)] = (0, 255, 0)
+
+        save_artifact(vis_path, vis_img, artifact_writer)
+
+        result["processed_image_path"] = processed_path
+        result["visualization_path"] = vis_path
+        lap("artifacts")
+
+    return result
+
+def _init_worker():
+    """Keep OpenCV single-threaded inside pool workers to avoid oversubscription"""
+    cv2.setNumThreads(1)
+    init_worker_writer()
+
+def run_image_pairs(jobs, workers=1):
+    """Process image pair jobs, yielding (index, result, error) as each finishes"""
+    if workers is None or workers < 1:
+        workers = os.cpu_count() or 1
+
+    if workers == 1:
+        writer = ArtifactWriter()
+        try:
+            for index, args in enumerate(jobs):
+                try:
+                    yield index, process_image_pair(*args, artifact_writer=writer), None
+                except Exception as e:
+                    yield index, None, e
+        finally:
+            writer.close()
+        return
+
+    executor = ProcessPoolExecutor(max_workers=workers, initializer=_init_worker)
+    try:
+        futures = {executor.submit(process_image_pair, *args): index for index, args in enumerate(jobs)}
+        for future in as_completed(futures):
+            index = futures[future]
+            try:
+                yield index, future.result(), None
+            except Exception as e:
+                yield index, None, e
+    finally:
+        # A caller that stops early (e.g. a cancelled job) doesn't wait for pairs that never started
+        executor.shutdown(wait=True, cancel_futures=True)
@@ -2,61 +2,360 @@
 import numpy as np
 import os
 from math import radians, cos, sin, tan
+from concurrent.futures import ThreadPoolExecutor
 import cv2
 
-def convert_to_3d(points_2d, angle, image_width, image_height, img_num, cylinder_radius=1000):
+# scipy is optional; without it OpenCV's FLANN KD-tree is used
+try:
+    from scipy.spatial import cKDTree
+except ImportError:
+    cKDTree = None
+
+# Turntable geometry: 200 steps per revolution, 1.8 degrees per step
+ANGLE_STEP = 1.8
+STEPS_PER_REVOLUTION = 200
+
+# Laser plane angle relative to the camera axis
+LASER_ANGLE = radians(30)
+
+# Object radius the image width is scaled to
+CYLINDER_RADIUS = 1000
+
+# Rotation tables for every turntable step, computed once at import
+_STEP_ANGLES = np.radians(np.arange(STEPS_PER_REVOLUTION) * ANGLE_STEP)
+ROTATION_COS = np.cos(_STEP_ANGLES)
+ROTATION_SIN = np.sin(_STEP_ANGLES)
+
+def _rotation_for(angle, img_num):
+    """Look up cos/sin of the turntable angle, falling back to direct math"""
+    if 0 <= img_num < STEPS_PER_REVOLUTION and np.isclose(angle, img_num * ANGLE_STEP):
+        return ROTATION_COS[img_num], ROTATION_SIN[img_num]
+    theta2 = radians(angle)
+    return cos(theta2), sin(theta2)
+
+def _triangulate(points_2d, cos_t, sin_t, image_width, image_height, cylinder_radius):
+    """Triangulate an (N, 2) array with per-point or scalar rotation terms"""
+    points_2d = np.asarray(points_2d, dtype=np.float64)
+    x = points_2d[:, 0]
+    y = points_2d[:, 1]
+    
+    # Radius from center (positive means left of center) and depth from the laser angle
+    r = image_width / 2 - x
+    z = r / tan(LASER_ANGLE)
+    
+    scale = cylinder_radius / image_width
+    points_3d = np.empty((len(points_2d), 3), dtype=np.float32)
+    points_3d[:, 0] = (r * cos_t - z * sin_t) * scale
+    points_3d[:, 1] = (image_height - y) / image_height * (cylinder_radius * 1.35)
+    points_3d[:, 2] = (r * sin_t + z * cos_t) * scale
+    return points_3d
+
+def convert_to_3d(points_2d, angle, image_width, image_height, img_num, cylinder_radius=CYLINDER_RADIUS):
     """Convert 2D image points to 3D coordinates"""
     if len(points_2d) == 0:
-        return np.array([])
+        return np.empty((0, 3), dtype=np.float32)
     
-    # Convert angles to radians
-    theta = radians(30)
-    theta2 = radians(angle)
+    cos_t, sin_t = _rotation_for(angle, img_num)
+    return _triangulate(points_2d, cos_t, sin_t, image_width, image_height, cylinder_radius)
+
+def convert_scan_to_3d(points_per_angle, img_nums, image_width, image_height, cylinder_radius=CYLINDER_RADIUS):
+    """Convert the 2D points of a whole scan to 3D in one broadcast pass"""
+    counts = np.array([len(p) for p in points_per_angle], dtype=np.intp)
+    if counts.sum() == 0:
+        return np.empty((0, 3), dtype=np.float32)
     
-    # Calculate image midpoint
-    midpoint_x = image_width / 2
+    points_2d = np.concatenate([np.asarray(p).reshape(-1, 2) for p in points_per_angle if len(p)])
+    steps = np.repeat(np.asarray(img_nums, dtype=np.intp), counts)
     
-    # Initialize 3D points array
-    points_3d = []
+    # Steps outside one revolution wrap around to the same physical angle
+    steps = steps % STEPS_PER_REVOLUTION
+    return _triangulate(points_2d, ROTATION_COS[steps], ROTATION_SIN[steps],
+                        image_width, image_height, cylinder_radius)
+
+VOXEL_POLICIES = ("centroid", "first")
+
+# Voxel indices are packed into one int64 key, 21 bits per axis
+_VOXEL_BITS = 21
+_VOXEL_OFFSET = 1 << (_VOXEL_BITS - 1)
+
+def voxel_keys(points, voxel_size):
+    """Pack the integer voxel coordinates of (N, 3) points into int64 keys"""
+    cells = np.floor(np.asarray(points, dtype=np.float64) / voxel_size).astype(np.int64) + _VOXEL_OFFSET
+    if len(cells) and (cells.min() < 0 or cells.max() >= 1 << _VOXEL_BITS):
+        raise ValueError(f"Points span too many voxels of size {voxel_size}")
+    return (cells[:, 0] << (2 * _VOXEL_BITS)) | (cells[:, 1] << _VOXEL_BITS) | cells[:, 2]
+
+class VoxelGrid:
+    """Incremental voxel-grid downsampling on sorted integer voxel keys"""
     
-    for x, y in points_2d:
-        # Calculate distance from center
-        r = midpoint_x - x  # Radius from center (positive means left of center)
-        
-        # Calculate Z using triangulation based on laser angle
-        z = r / tan(theta)
+    def __init__(self, voxel_size, policy="centroid"):
+        if voxel_size <= 0:
+            raise ValueError(f"Voxel size must be positive: {voxel_size}")
+        if policy not in VOXEL_POLICIES:
+            raise ValueError(f"Unknown voxel policy: {policy}")
+        self.voxel_size = voxel_size
+        self.policy = policy
+        self.points_added = 0
+        # Each run is (sorted unique keys, values); values are sums and
+        # counts for "centroid" and nothing for "first"
+        self._runs = []
+    
+    @property
+    def voxel_count(self):
+        return sum(len(keys) for keys, _ in self._runs)
+    
+    def _contains(self, keys):
+        """Boolean mask of keys already present in any run"""
+        found = np.zeros(len(keys), dtype=bool)
+        for run_keys, _ in self._runs:
+            positions = np.searchsorted(run_keys, keys)
+            positions[positions == len(run_keys)] = 0
+            found |= run_keys[positions] == keys
+        return found
+    
+    def _reduce(self, keys, points, counts=None):
+        """Collapse duplicate keys; earlier entries win for the "first" policy"""
+        unique, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        if self.policy == "first":
+            return unique, None
+        sums = np.empty((len(unique), 3), dtype=np.float64)
+        for axis in range(3):
+            sums[:, axis] = np.bincount(inverse, weights=points[:, axis], minlength=len(unique))
+        if counts is None:
+            counts = np.ones(len(keys), dtype=np.int64)
+        merged_counts = np.bincount(inverse, weights=counts, minlength=len(unique)).astype(np.int64)
+        return unique, (sums, merged_counts)
+    
+    def _merge_runs(self):
+        while len(self._runs) > 1 and len(self._runs[-2][0]) <= 2 * len(self._runs[-1][0]):
+            (keys_a, values_a), (keys_b, values_b) = self._runs[-2], self._runs[-1]
+            keys = np.concatenate((keys_a, keys_b))
+            if self.policy == "first":
+                self._runs[-2:] = [self._reduce(keys, None)]
+            else:
+                sums = np.concatenate((values_a[0], values_b[0]))
+                counts = np.concatenate((values_a[1], values_b[1]))
+                self._runs[-2:] = [self._reduce(keys, sums, counts)]
+    
+    def add(self, points):
+        """Add an (N, 3) batch and return the points that can be written now"""
+        points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        empty = np.empty((0, 3), dtype=np.float32)
+        if len(points) == 0:
+            return empty
+        self.points_added += len(points)
+        keys = voxel_keys(points, self.voxel_size)
         
-        # Normalize Y coordinate
-        y_3d = (image_height - y) / image_height
+        if self.policy == "first":
+            unique, first = np.unique(keys, return_index=True)
+            new = ~self._contains(unique)
+            if not new.any():
+                return empty
+            self._runs.append((unique[new], None))
+            self._merge_runs()
+            return points[np.sort(first[new])]
         
-        # Apply rotation to convert to final 3D coordinates
-        x_3d = r * cos(theta2) - z * sin(theta2)
-        z_3d = r * sin(theta2) + z * cos(theta2)
+        self._runs.append(self._reduce(keys, points.astype(np.float64)))
+        self._merge_runs()
+        return empty
+    
+    def finish(self):
+        """Return the points that were not returned by add()"""
+        if self.policy == "first" or not self._runs:
+            return np.empty((0, 3), dtype=np.float32)
+        keys = np.concatenate([keys for keys, _ in self._runs])
+        sums = np.concatenate([values[0] for _, values in self._runs])
+        counts = np.concatenate([values[1] for _, values in self._runs])
+        _, (sums, counts) = self._reduce(keys, sums, counts)
+        return (sums / counts[:, None]).astype(np.float32)
+
+def voxel_downsample(points, voxel_size, policy="centroid"):
+    """Reduce a whole cloud to at most one point per voxel"""
+    grid = VoxelGrid(voxel_size, policy)
+    kept = grid.add(points)
+    return np.concatenate((kept, grid.finish()))
+
+# Query points per k-nearest-neighbour batch, bounding the distance buffers
+NEIGHBOR_QUERY_BATCH = 100000
+
+# FLANN algorithm 4 is a single exact KD-tree
+_FLANN_KDTREE_SINGLE = 4
+
+class NeighborIndex:
+    """KD-tree over a point cloud (scipy if installed, else OpenCV FLANN), queried in batches"""
+    
+    def __init__(self, points, workers=None):
+        self.points = np.ascontiguousarray(points, dtype=np.float32).reshape(-1, 3)
+        self.workers = workers or os.cpu_count() or 1
+        if cKDTree is not None:
+            self._tree = cKDTree(self.points)
+        else:
+            self._tree = cv2.flann_Index(self.points, dict(algorithm=_FLANN_KDTREE_SINGLE, leaf_max_size=10))
+    
+    def _query(self, queries, k):
+        if cKDTree is not None:
+            distances, _ = self._tree.query(queries, k, workers=self.workers)
+            return distances.reshape(len(queries), k).astype(np.float32)
+        # FLANN returns squared distances
+        _, distances = self._tree.knnSearch(queries, k, params=dict(checks=-1))
+        return np.sqrt(distances)
+    
+    def knn_distances(self, k, batch_size=NEIGHBOR_QUERY_BATCH):
+        """Distances from every point to its k nearest other points, as (N, k)"""
+        k = min(k, len(self.points) - 1)
+        distances = np.empty((len(self.points), k), dtype=np.float32)
+        starts = range(0, len(self.points), batch_size)
         
-        # Scale coordinates to reasonable values
-        scale = cylinder_radius / image_width
-        x_3d *= scale
-        z_3d *= scale
-        y_3d *= cylinder_radius*1.35
+        def run(start):
+            # The nearest hit is the point itself
+            distances[start:start + batch_size] = self._query(self.points[start:start + batch_size], k + 1)[:, 1:]
         
-        points_3d.append([x_3d, y_3d, z_3d])
+        # scipy parallelises each query itself; FLANN releases the GIL per batch
+        if cKDTree is not None or self.workers == 1:
+            for start in starts:
+                run(start)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                list(executor.map(run, starts))
+        return distances
+
+def statistical_outlier_mask(distances, neighbors, std_ratio):
+    """Keep points whose mean distance to their k neighbours is within std_ratio deviations of the average"""
+    mean_distances = distances[:, :neighbors].mean(axis=1)
+    return mean_distances <= mean_distances.mean() + std_ratio * mean_distances.std()
+
+def radius_outlier_mask(distances, radius, min_neighbors):
+    """Keep points with at least min_neighbors other points within radius"""
+    return distances[:, min_neighbors - 1] <= radius
+
+def remove_outliers(points, neighbors=0, std_ratio=2.0, radius=0, min_neighbors=4, workers=None):
+    """Statistical and/or radius outlier removal; returns (kept points, removed counts)"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    dropped = {"statistical": 0, "radius": 0}
+    k = max(neighbors, min_neighbors if radius > 0 else 0)
+    if k == 0 or len(points) <= k:
+        return points, dropped
+    
+    distances = NeighborIndex(points, workers).knn_distances(k)
+    keep = np.ones(len(points), dtype=bool)
+    if neighbors > 0:
+        keep &= statistical_outlier_mask(distances, neighbors, std_ratio)
+        dropped["statistical"] = int(len(points) - keep.sum())
+    if radius > 0:
+        before = int(keep.sum())
+        keep &= radius_outlier_mask(distances, radius, min_neighbors)
+        dropped["radius"] = before - int(keep.sum())
+    return points[keep], dropped
+
+PLY_FORMATS = ("ascii", "binary_little_endian")
+
+# Rows written per write() call when saving a whole cloud
+PLY_CHUNK_SIZE = 1000000
+
+class PlyWriter:
+    """Stream a point cloud to a PLY file one chunk at a time"""
+    # The vertex count is patched in place, padded with trailing spaces that PLY readers ignore
+    COUNT_WIDTH = 10
+    
+    def __init__(self, output_file, fmt="binary_little_endian"):
+        if fmt not in PLY_FORMATS:
+            raise ValueError(f"Unsupported PLY format: {fmt}")
+        self.output_file = output_file
+        self.fmt = fmt
+        self.count = 0
+        self._file = open(output_file, 'wb')
+        self._write_header()
+    
+    def _write_header(self):
+        self._file.write(b"ply\n")
+        self._file.write(f"format {self.fmt} 1.0\n".encode())
+        self._file.write(b"element vertex ")
+        self._count_offset = self._file.tell()
+        self._file.write(f"{0:<{self.COUNT_WIDTH}d}\n".encode())
+        self._file.write(b"property float x\n")
+        self._file.write(b"property float y\n")
+        self._file.write(b"property float z\n")
+        self._file.write(b"end_header\n")
+    
+    def write(self, points):
+        """Append an (N, 3) array of points"""
+        if len(points) == 0:
+            return
+        chunk = np.ascontiguousarray(np.asarray(points).reshape(-1, 3), dtype='<f4')
+        if self.fmt == "ascii":
+            np.savetxt(self._file, chunk, fmt='%.9g')
+        else:
+            self._file.write(memoryview(chunk).cast('B'))
+        self.count += len(chunk)
+    
+    def flush(self):
+        """Patch the current vertex count so the file is a valid partial cloud"""
+        end = self._file.tell()
+        self._file.seek(self._count_offset)
+        self._file.write(f"{self.count:<{self.COUNT_WIDTH}d}".encode())
+        self._file.seek(end)
+        self._file.flush()
+    
+    def close(self):
+        """Patch the vertex count into the header and close the file"""
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
     
-    return np.array(points_3d)
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
 
-def save_ply(points, output_file):
+def save_ply(points, output_file, fmt="binary_little_endian"):
     """Save point cloud as PLY file"""
-    with open(output_file, 'w') as f:
-        # Write header
-        f.write("ply\n")
-        f.write("format ascii 1.0\n")
-        f.write(f"element vertex {len(points)}\n")
-        f.write("property float x\n")
-        f.write("property float y\n")
-        f.write("property float z\n")
-        f.write("end_header\n")
-        
-        # Write vertices
-        for x, y, z in points:
-            f.write(f"{x} {y} {z}\n")
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    with PlyWriter(output_file, fmt) as writer:
+        for start in range(0, len(points), PLY_CHUNK_SIZE):
+            writer.write(points[start:start + PLY_CHUNK_SIZE])
     
-    return f"Saved {len(points)} points to {output_file}"
\ No newline at end of file
+    return f"Saved {len(points)} points to {output_file}"
+
+def load_ply(input_file):
+    """Load the vertices of an ASCII or binary little-endian PLY as an (N, 3) float32 array"""
+    with open(input_file, 'rb') as f:
+        if f.readline().strip() != b"ply":
+            raise ValueError(f"Not a PLY file: {input_file}")
+        fmt = None
+        count = 0
+        properties = []
+        in_vertex = False
+        while True:
+            line = f.readline()
+            if not line:
+                raise ValueError(f"Truncated PLY header: {input_file}")
+            parts = line.decode('ascii').split()
+            if not parts:
+                continue
+            if parts[0] == "format":
+                fmt = parts[1]
+            elif parts[0] == "element":
+                in_vertex = parts[1] == "vertex"
+                if in_vertex:
+                    count = int(parts[2])
+            elif parts[0] == "property" and in_vertex:
+                properties.append((parts[2], parts[1]))
+            elif parts[0] == "end_header":
+                break
+        
+        if fmt not in PLY_FORMATS:
+            raise ValueError(f"Unsupported PLY format: {fmt}")
+        if [name for name, _ in properties[:3]] != ["x", "y", "z"]:
+            raise ValueError(f"PLY vertices must start with x, y, z: {input_file}")
+        
+        if fmt == "ascii":
+            data = np.loadtxt(f, dtype=np.float32, max_rows=count, ndmin=2)
+            return np.ascontiguousarray(data[:, :3])
+        
+        ply_types = {"float": "<f4", "float32": "<f4", "double": "<f8", "float64": "<f8",
+                     "uchar": "u1", "uint8": "u1", "int": "<i4", "int32": "<i4"}
+        dtype = np.dtype([(name, ply_types[kind]) for name, kind in properties])
+        data = np.fromfile(f, dtype=dtype, count=count)
+        return np.column_stack((data["x"], data["y"], data["z"])).astype(np.float32)
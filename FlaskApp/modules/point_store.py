@@ -0,0 +1,101 @@
+# modules/point_store.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+import numpy as np
+
+from modules.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+POINT_STORE_DIR = "points"
+# Bump when extraction or triangulation changes, so stores written by older code start over
+POINT_STORE_VERSION = 2
+MANIFEST_FILE = "manifest.json"
+POINT_DTYPE = "<f4"
+ROW_DTYPE = "<i4"
+
+def settings_signature(settings):
+    """Stable digest of everything that decides an angle's points"""
+    def default(value):
+        if isinstance(value, np.ndarray):
+            return value.tolist()
+        return str(value)
+    encoded = json.dumps(settings, sort_keys=True, default=default).encode()
+    return hashlib.sha1(encoded).hexdigest()
+
+class PointStore:
+    """Per-angle point chunks on disk, memory-mapped when read back"""
+
+    def __init__(self, directory, settings):
+        self.directory = directory
+        self.signature = settings_signature({"version": POINT_STORE_VERSION, "settings": settings})
+        self.manifest = self._load_manifest()
+        if self.manifest is None or self.manifest.get("signature") != self.signature:
+            if os.path.isdir(directory):
+                logger.info(f"Point store {directory} does not match the current settings, starting over")
+                shutil.rmtree(directory)
+            self.manifest = {"signature": self.signature, "dtype": POINT_DTYPE, "angles": {}}
+        os.makedirs(directory, exist_ok=True)
+
+    def _load_manifest(self):
+        try:
+            with open(os.path.join(self.directory, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_manifest(self):
+        with atomic_write(os.path.join(self.directory, MANIFEST_FILE), 'w') as f:
+            json.dump(self.manifest, f)
+
+    def _save_array(self, name, array):
+        with atomic_write(os.path.join(self.directory, f"{name}.npy")) as f:
+            np.save(f, array)
+
+    def __contains__(self, index):
+        return str(index) in self.manifest["angles"]
+
+    def __len__(self):
+        return len(self.manifest["angles"])
+
+    def indices(self):
+        """Completed angle indices in order"""
+        return sorted(int(index) for index in self.manifest["angles"])
+
+    def info(self, index):
+        return self.manifest["angles"][str(index)]
+
+    @property
+    def point_count(self):
+        return sum(entry["count"] for entry in self.manifest["angles"].values())
+
+    def add(self, index, points, rows, **info):
+        """Save one angle's points and image rows, then mark it complete"""
+        points = np.ascontiguousarray(points, dtype=POINT_DTYPE).reshape(-1, 3)
+        rows = np.ascontiguousarray(rows, dtype=ROW_DTYPE).reshape(-1)
+        self._save_array(str(index), points)
+        self._save_array(f"{index}_rows", rows)
+        self.manifest["angles"][str(index)] = dict(info, count=len(points))
+        self._save_manifest()
+
+    def _load(self, name, index, dtype, shape):
+        # Empty arrays can't be memory-mapped
+        if self.info(index)["count"] == 0:
+            return np.empty(shape, dtype=dtype)
+        return np.load(os.path.join(self.directory, f"{name}.npy"), mmap_mode='r')
+
+    def points(self, index):
+        """Read-only memory-mapped (N, 3) float32 view of one angle"""
+        return self._load(str(index), index, POINT_DTYPE, (0, 3))
+
+    def rows(self, index):
+        """Read-only memory-mapped image rows of one angle's points"""
+        return self._load(f"{index}_rows", index, ROW_DTYPE, (0,))
+
+    def iter_points(self):
+        """(index, points view) for every completed angle, in angle order"""
+        for index in self.indices():
+            yield index, self.points(index)
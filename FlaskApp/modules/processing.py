@@ -0,0 +1,267 @@
+# modules/processing.py
+import os
+import time
+import datetime
+import numpy as np
+
+from modules.image_processor import load_crop, sort_by_step, BLUR_KERNEL
+from modules.storage import refresh_scan_index_entry
+from modules.point_cloud import PlyWriter, VoxelGrid, remove_outliers, load_ply, STEPS_PER_REVOLUTION, ANGLE_STEP, LASER_ANGLE, CYLINDER_RADIUS
+from modules.mesh import OrganizedGrid, triangulate_grid, save_mesh
+from modules.tiles import build_tiles, TILES_DIR
+from modules.point_store import PointStore, POINT_STORE_DIR
+from modules.stage_cache import StageCache
+from modules.pipeline import run_image_pairs
+from modules.calibration import load_calibration
+from modules.metrics import StageMetrics, global_metrics, format_summary
+from config import IMAGES_FOLDER, LASER_THRESHOLD, SUBPIXEL_MODE, PLY_FORMAT, PROCESSING_WORKERS, ARTIFACT_LEVEL, DECODE_SCALE, VOXEL_SIZE, VOXEL_POLICY, OUTLIER_NEIGHBORS, OUTLIER_STD_RATIO, OUTLIER_RADIUS, OUTLIER_MIN_NEIGHBORS, MESH_EXPORT, MESH_EXPORT_FORMATS, MESH_MAX_EDGE, TILE_EXPORT, TILE_MAX_POINTS, STAGE_CACHE_FOLDER, STAGE_CACHE_STAGES, STAGE_CACHE_MAX_BYTES
+
+def process_scan_images(scan_id, status_queue, cancel_event=None):
+    """Reconstruct a scan, publishing status events through ``status_queue.put``"""
+    try:
+        # Define paths
+        scan_dir = os.path.join(IMAGES_FOLDER, scan_id)
+        laser_on_dir = os.path.join(scan_dir, "laser_on")
+        laser_off_dir = os.path.join(scan_dir, "laser_off")
+        processed_dir = os.path.join(scan_dir, "processed")
+        cropped_dir = os.path.join(scan_dir, "cropped")
+        
+        # Prefer the stored crop rectangle, applied to each decoded frame
+        crop = load_crop(scan_dir)
+        if crop is not None:
+            status_queue.put({"status": "info", "message": f"Cropping frames to {crop['width']}x{crop['height']} at ({crop['x']}, {crop['y']})"})
+        # Otherwise fall back to images cropped to disk by older versions
+        elif os.path.exists(cropped_dir) and os.path.exists(os.path.join(cropped_dir, "laser_on")):
+            laser_on_dir = os.path.join(cropped_dir, "laser_on")
+            laser_off_dir = os.path.join(cropped_dir, "laser_off")
+            status_queue.put({"status": "info", "message": "Using cropped images for processing"})
+
+        # Create processed directory if it doesn't exist
+        os.makedirs(processed_dir, exist_ok=True)
+        
+        # Get matching image pairs
+        # Sort numerically so image_10 pairs with image_210, not image_202
+        laser_on_files = sort_by_step([f for f in os.listdir(laser_on_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
+        laser_off_files = sort_by_step([f for f in os.listdir(laser_off_dir) if f.endswith(('.jpg', '.jpeg', '.png'))])
+        
+        # Ensure we have matching pairs
+        if len(laser_on_files) != len(laser_off_files):
+            status_queue.put({"status": "error", "message": "Mismatched number of images in laser_on and laser_off folders"})
+            return
+        
+        # Update status
+        status_queue.put({
+            "status": "starting", 
+            "message": f"Starting processing of {len(laser_on_files)} image pairs", 
+            "total_images": len(laser_on_files),
+            "processed_images": 0
+        })
+        
+        # Load the scan's (or the device's) camera calibration
+        camera_matrix, dist_coeffs = load_calibration(scan_dir)
+        if camera_matrix is not None:
+            status_queue.put({"status": "info", "message": "Undistorting images with camera calibration"})
+        
+        # Build one job per image pair
+        jobs = [(scan_dir, processed_dir, os.path.join(laser_on_dir, on_file), os.path.join(laser_off_dir, off_file),
+                 LASER_THRESHOLD, SUBPIXEL_MODE, ARTIFACT_LEVEL, camera_matrix, dist_coeffs, crop, DECODE_SCALE,
+                 STAGE_CACHE_FOLDER, STAGE_CACHE_STAGES)
+                for on_file, off_file in zip(laser_on_files, laser_off_files)]
+        
+        # Each finished pair is saved to the point store, so an interrupted job resumes where it stopped
+        frame_stats = []
+        for folder, names in ((laser_on_dir, laser_on_files), (laser_off_dir, laser_off_files)):
+            for name in names:
+                stat = os.stat(os.path.join(folder, name))
+                frame_stats.append((os.path.relpath(folder, scan_dir), name, stat.st_size, stat.st_mtime_ns))
+        point_store = PointStore(os.path.join(processed_dir, POINT_STORE_DIR), {
+            "frames": frame_stats, "threshold": LASER_THRESHOLD, "subpixel": SUBPIXEL_MODE, "crop": crop,
+            "camera_matrix": camera_matrix, "dist_coeffs": dist_coeffs, "decode_scale": DECODE_SCALE,
+            "blur_kernel": BLUR_KERNEL, "laser_angle": LASER_ANGLE, "cylinder_radius": CYLINDER_RADIUS,
+            "angle_step": ANGLE_STEP, "steps_per_revolution": STEPS_PER_REVOLUTION
+        })
+        remaining = [index for index in range(len(jobs)) if index not in point_store]
+        cache_hits = {"preprocess": 0, "lines": 0}
+        processed_count = len(jobs) - len(remaining)
+        if processed_count:
+            status_queue.put({
+                "status": "processing",
+                "message": f"Resuming with {processed_count}/{len(jobs)} image pairs already processed",
+                "processed_images": processed_count
+            })
+        
+        output_ply = os.path.join(processed_dir, "reconstructed_model.ply")
+        raw_points = 0
+        scan_metrics = StageMetrics()
+        
+        def record(stage, start):
+            elapsed = time.perf_counter() - start
+            for registry in (scan_metrics, global_metrics):
+                registry.observe(stage, elapsed)
+        
+        # Optionally merge the points of overlapping angles per voxel as they arrive
+        voxel_grid = VoxelGrid(VOXEL_SIZE, VOXEL_POLICY) if VOXEL_SIZE > 0 else None
+        
+        # Outlier removal needs the whole cloud, so points are held back until the end
+        filter_outliers = OUTLIER_NEIGHBORS > 0 or OUTLIER_RADIUS > 0
+        held_points = []
+        outliers_removed = None
+        
+        # Keep the organized (angle x row) layout for meshing
+        mesh_grid = None
+        mesh_paths = []
+        
+        for position, result, error in run_image_pairs([jobs[index] for index in remaining], PROCESSING_WORKERS):
+            index = remaining[position]
+            processed_count += 1
+            on_file, off_file = laser_on_files[index], laser_off_files[index]
+            
+            if error is not None:
+                status_queue.put({"status": "warning", "message": f"Error processing image pair {on_file}/{off_file}: {str(error)}"})
+                continue
+            
+            angle = result["angle"]
+            start = time.perf_counter()
+            point_store.add(index, result["points_3d"], result["rows"], angle=angle, image_height=result["image_height"])
+            record("point_store", start)
+            for registry in (scan_metrics, global_metrics):
+                registry.merge(result["timings"])
+            for stage in result["cached_stages"]:
+                cache_hits[stage] += 1
+                global_metrics.increment(f"stage_cache_{stage}_hits_total")
+            
+            # Update status
+            status_queue.put({
+                "status": "processing", 
+                "message": f"Processed image pair {processed_count}/{len(jobs)} (angle: {angle:.1f}°)",
+                "processed_images": processed_count,
+                "current_angle": angle
+            })
+            
+            # Update status with image info
+            if result["points_detected"] > 0:
+                status_queue.put({
+                    "status": "image_processed",
+                    "angle": angle,
+                    "points_detected": result["points_detected"],
+                    "processed_image_path": result["processed_image_path"],
+                    "visualization_path": result["visualization_path"]
+                })
+            
+            # Stored angles are kept, so processing the scan again resumes from here
+            if cancel_event is not None and cancel_event.is_set():
+                status_queue.put({"status": "cancelled", "message": f"Processing cancelled after {processed_count}/{len(jobs)} image pairs"})
+                return
+        
+        if any(cache_hits.values()):
+            status_queue.put({"status": "info", "message": f"Reused cached laser lines for {cache_hits['lines']} and preprocessed images for {cache_hits['preprocess']} of {len(remaining)} image pairs"})
+        if STAGE_CACHE_FOLDER:
+            start = time.perf_counter()
+            StageCache(STAGE_CACHE_FOLDER, STAGE_CACHE_MAX_BYTES).evict()
+            record("cache_evict", start)
+        
+        # Export from memory-mapped views of the stored angles, in angle order
+        with PlyWriter(output_ply, PLY_FORMAT) as ply_writer:
+            def write_points(points):
+                if filter_outliers:
+                    held_points.append(points)
+                    return
+                start = time.perf_counter()
+                ply_writer.write(points)
+                record("ply_write", start)
+            
+            for index, points_3d in point_store.iter_points():
+                if len(points_3d) == 0:
+                    continue
+                raw_points += len(points_3d)
+                if MESH_EXPORT:
+                    if mesh_grid is None:
+                        mesh_grid = OrganizedGrid(len(jobs), point_store.info(index)["image_height"])
+                    mesh_grid.set_angle(index, point_store.rows(index), points_3d)
+                if voxel_grid is not None:
+                    start = time.perf_counter()
+                    points_3d = voxel_grid.add(points_3d)
+                    record("voxel", start)
+                write_points(points_3d)
+            
+            # Centroids are only final once every angle has been added
+            if voxel_grid is not None:
+                start = time.perf_counter()
+                points_3d = voxel_grid.finish()
+                record("voxel", start)
+                write_points(points_3d)
+                reduced_points = ply_writer.count + sum(len(p) for p in held_points)
+                status_queue.put({"status": "info", "message": f"Voxel grid ({VOXEL_SIZE}, {VOXEL_POLICY}) reduced {raw_points} points to {reduced_points}"})
+            
+            if filter_outliers:
+                start = time.perf_counter()
+                cloud = np.concatenate(held_points) if held_points else np.empty((0, 3), dtype=np.float32)
+                held_points.clear()
+                points_3d, outliers_removed = remove_outliers(cloud, OUTLIER_NEIGHBORS, OUTLIER_STD_RATIO,
+                                                              OUTLIER_RADIUS, OUTLIER_MIN_NEIGHBORS)
+                record("outliers", start)
+                status_queue.put({"status": "info", "message": f"Removed {outliers_removed['statistical']} statistical and {outliers_removed['radius']} radius outliers from {len(cloud)} points"})
+                
+                start = time.perf_counter()
+                ply_writer.write(points_3d)
+                record("ply_write", start)
+        
+        # Connect neighbouring angles and rows into a mesh
+        if mesh_grid is not None:
+            start = time.perf_counter()
+            vertices, faces = triangulate_grid(mesh_grid.points, mesh_grid.valid,
+                                               close_loop=len(jobs) == STEPS_PER_REVOLUTION,
+                                               max_edge=MESH_MAX_EDGE or None)
+            for fmt in MESH_EXPORT_FORMATS:
+                mesh_path = os.path.join(processed_dir, f"reconstructed_mesh.{fmt}")
+                status_queue.put({"status": "info", "message": save_mesh(vertices, faces, mesh_path, fmt)})
+                mesh_paths.append(mesh_path)
+            record("mesh", start)
+        
+        # Report the final point cloud
+        total_points = ply_writer.count
+        timings = scan_metrics.summary()
+        if total_points:
+            ply_result = f"Saved {total_points} points to {output_ply}"
+            
+            # Level-of-detail tiles let the viewer show a coarse cloud before the rest arrives
+            if TILE_EXPORT:
+                start = time.perf_counter()
+                tile_index = build_tiles(load_ply(output_ply), os.path.join(processed_dir, TILES_DIR), TILE_MAX_POINTS)
+                record("tiles", start)
+                status_queue.put({"status": "info", "message": f"Built {len(tile_index['nodes'])} viewer tiles"})
+            
+            # Create processing_info.txt file
+            with open(os.path.join(processed_dir, "processing_info.txt"), 'w') as f:
+                f.write(f"Processed on {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+                f.write(f"Total points: {total_points}\n")
+                if voxel_grid is not None:
+                    f.write(f"Points before voxel downsampling: {raw_points} (voxel size {VOXEL_SIZE}, {VOXEL_POLICY})\n")
+                if outliers_removed is not None:
+                    f.write(f"Outliers removed: {outliers_removed['statistical']} statistical, {outliers_removed['radius']} radius\n")
+                f.write(f"Total images processed: {len(laser_on_files)}\n")
+                f.write("Stage timings:\n")
+                f.write("".join(line + "\n" for line in format_summary(timings)))
+            
+            status_queue.put({
+                "status": "completed", 
+                "message": ply_result,
+                "total_points": total_points,
+                "raw_points": raw_points,
+                "outliers_removed": outliers_removed,
+                "mesh_paths": mesh_paths,
+                "ply_path": output_ply,
+                "timings": timings
+            })
+        else:
+            os.remove(output_ply)
+            status_queue.put({
+                "status": "warning", 
+                "message": "No 3D points were generated. Check your image processing parameters."
+            })
+        
+        # Processed outputs change the scan's size and processed flag
+        refresh_scan_index_entry(scan_id)
+            
+    except Exception as e:
+        status_queue.put({"status": "error", "message": f"Error during processing: {str(e)}"})
@@ -0,0 +1,174 @@
+# modules/scheduler.py
+import time
+import heapq
+import logging
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+JOB_STATES = ("queued", "running", "completed", "failed", "cancelled")
+
+class QueueFullError(ValueError):
+    """Raised by JobScheduler.submit when max_queued jobs are already waiting"""
+
+class Job:
+    """One scheduled unit of work, run as ``target(job, *args)``, and its resource accounting"""
+
+    def __init__(self, job_id, target, args=(), priority=0, event_log=None):
+        self.job_id = job_id
+        self.target = target
+        self.args = args
+        self.priority = priority
+        self.event_log = event_log
+        self.state = "queued"
+        self.error = None
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cpu_seconds = 0.0
+        self.cancel_event = threading.Event()
+
+    @property
+    def cancelled(self):
+        return self.cancel_event.is_set()
+
+    def resources(self):
+        """Queue wait, run time and CPU time of the job's thread (pool workers not included)"""
+        now = time.time()
+        started = self.started_at or self.finished_at or now
+        return {
+            "wait_seconds": round(started - self.submitted_at, 3),
+            "run_seconds": round((self.finished_at or now) - self.started_at, 3) if self.started_at else 0.0,
+            "cpu_seconds": round(self.cpu_seconds, 3)
+        }
+
+    def to_dict(self):
+        return {
+            "job_id": self.job_id,
+            "state": self.state,
+            "priority": self.priority,
+            "submitted_at": self.submitted_at,
+            "resources": self.resources()
+        }
+
+class JobScheduler:
+    """Runs jobs on a fixed number of threads from a priority queue"""
+
+    def __init__(self, max_concurrent=1, max_queued=None, on_done=None):
+        self.max_queued = max_queued
+        # Called once per job after it finishes or is cancelled while queued
+        self.on_done = on_done
+        self._queue = []
+        self._jobs = {}
+        self._order = itertools.count()
+        self._cond = threading.Condition()
+        self._workers = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True)
+                         for i in range(max(1, max_concurrent))]
+
+    def start(self):
+        """Start the worker threads; jobs submitted before wait in the queue"""
+        for worker in self._workers:
+            if not worker.is_alive():
+                worker.start()
+        return self
+
+    def submit(self, job_id, target, args=(), priority=0, event_log=None):
+        """Queue a job; raises ValueError if the id is pending or the queue is full"""
+        with self._cond:
+            current = self._jobs.get(job_id)
+            if current is not None and current.state in ("queued", "running"):
+                raise ValueError(f"Job {job_id} is already {current.state}")
+            if self.max_queued is not None and len(self._queue) >= self.max_queued:
+                raise QueueFullError(f"Job queue is full ({self.max_queued} waiting)")
+            job = Job(job_id, target, args, priority, event_log)
+            self._jobs[job_id] = job
+            heapq.heappush(self._queue, (-priority, next(self._order), job))
+            self._report_positions()
+            self._cond.notify()
+            return job
+
+    def get(self, job_id):
+        return self._jobs.get(job_id)
+
+    def is_full(self):
+        with self._cond:
+            return self.max_queued is not None and len(self._queue) >= self.max_queued
+
+    def cancel(self, job_id):
+        """Cancel a queued job or ask a running one to stop; returns its state or None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.state not in ("queued", "running"):
+                return None
+            job.cancel_event.set()
+            if job.state == "running":
+                return "running"
+            self._queue = [entry for entry in self._queue if entry[2] is not job]
+            heapq.heapify(self._queue)
+            job.state = "cancelled"
+            job.finished_at = time.time()
+            self._report_positions()
+        if job.event_log is not None:
+            job.event_log.put({"status": "cancelled", "message": "Processing cancelled before it started"})
+        self._done(job)
+        return "queued"
+
+    def queue_position(self, job_id):
+        """1-based position of a waiting job, or None"""
+        with self._cond:
+            for position, (_, _, job) in enumerate(sorted(self._queue), start=1):
+                if job.job_id == job_id:
+                    return position
+        return None
+
+    def snapshot(self):
+        """Running jobs, then waiting jobs in the order they will start"""
+        with self._cond:
+            running = [job.to_dict() for job in self._jobs.values() if job.state == "running"]
+            queued = [dict(job.to_dict(), queue_position=position)
+                      for position, (_, _, job) in enumerate(sorted(self._queue), start=1)]
+        return {"running": running, "queued": queued}
+
+    def _report_positions(self):
+        for position, (_, _, job) in enumerate(sorted(self._queue), start=1):
+            if job.event_log is not None:
+                ahead = position - 1
+                job.event_log.put({
+                    "status": "queued",
+                    "message": f"Waiting to start, {ahead} job{'s' if ahead != 1 else ''} ahead",
+                    "queue_position": position
+                })
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._queue:
+                    self._cond.wait()
+                _, _, job = heapq.heappop(self._queue)
+                job.state = "running"
+                job.started_at = time.time()
+                self._report_positions()
+
+            cpu_start = time.thread_time()
+            try:
+                job.target(job, *job.args)
+                job.state = "cancelled" if job.cancelled else "completed"
+            except Exception as e:
+                logger.error(f"Job {job.job_id} failed: {str(e)}")
+                job.state = "failed"
+                job.error = str(e)
+            job.cpu_seconds = time.thread_time() - cpu_start
+            job.finished_at = time.time()
+            self._done(job)
+
+    def _done(self, job):
+        if self.on_done is not None:
+            try:
+                self.on_done(job)
+            except Exception as e:
+                logger.error(f"Job completion handler failed for {job.job_id}: {str(e)}")
+        # Finished jobs would otherwise keep their arguments (e.g. event logs) alive
+        with self._cond:
+            if self._jobs.get(job.job_id) is job:
+                del self._jobs[job.job_id]
@@ -0,0 +1,78 @@
+# modules/stage_cache.py
+import os
+import logging
+import zipfile
+import numpy as np
+
+from modules.point_store import settings_signature
+from modules.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+CACHE_SUFFIX = ".npz"
+
+def frame_signature(path):
+    """(path, size, mtime) of a frame, which changes whenever the file is rewritten, without reading it"""
+    stat = os.stat(path)
+    return (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+def stage_key(stage, *parts):
+    """Cache key of a stage from its name, input signatures and parameters"""
+    return settings_signature([stage, *parts])
+
+class StageCache:
+    """Size-bounded on-disk cache of stage results keyed by their inputs"""
+
+    def __init__(self, directory, max_bytes=0):
+        self.directory = directory
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key + CACHE_SUFFIX)
+
+    def get(self, key):
+        """Arrays stored under key as a dict, or None on a miss"""
+        path = self._path(key)
+        try:
+            with np.load(path) as entry:
+                arrays = {name: entry[name] for name in entry.files}
+            os.utime(path)
+            return arrays
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zipfile.BadZipFile) as e:
+            logger.warning(f"Dropping unreadable cache entry {path}: {str(e)}")
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+
+    def put(self, key, **arrays):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with atomic_write(path) as f:
+            np.savez_compressed(f, **arrays)
+
+    def evict(self):
+        """Remove least recently used entries beyond max_bytes, returning (entries, bytes) removed"""
+        entries = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                if name.endswith(CACHE_SUFFIX):
+                    stat = os.stat(os.path.join(dirpath, name))
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, name)))
+
+        total = sum(size for _, size, _ in entries)
+        removed, removed_bytes = 0, 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+            removed_bytes += size
+        return removed, removed_bytes
@@ -5,10 +5,149 @@ import shutil
 import json
 import cv2
 import logging
-from config import IMAGES_FOLDER
+import atexit
+import threading
+from modules.utils import atomic_write
+from config import IMAGES_FOLDER, SCAN_INDEX_SAVE_INTERVAL
 
 logger = logging.getLogger(__name__)
 
+# Persistent per-scan metadata so listing scans never walks the scan tree
+SCAN_INDEX_FILE = os.path.join(IMAGES_FOLDER, "scan_index.json")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+_scan_index = None
+_index_stamp = None  # (mtime_ns, size) of the index file when last read or written
+_index_lock = threading.RLock()
+# Scans whose upload counters changed since the index was last written
+_dirty = set()
+_save_timer = None
+
+def _scan_entry(scan_path):
+    """Collect image counts, size and processed flag for one scan by walking it"""
+    def count_images(folder):
+        folder_path = os.path.join(scan_path, folder)
+        if not os.path.isdir(folder_path):
+            return 0
+        return len([f for f in os.listdir(folder_path)
+                    if os.path.isfile(os.path.join(folder_path, f)) and f.endswith(IMAGE_EXTENSIONS)])
+    
+    total_size = 0
+    for dirpath, dirnames, filenames in os.walk(scan_path):
+        for f in filenames:
+            total_size += os.path.getsize(os.path.join(dirpath, f))
+    
+    return {
+        'laser_on_images': count_images("laser_on"),
+        'laser_off_images': count_images("laser_off"),
+        'size_bytes': total_size,
+        'processed': os.path.exists(os.path.join(scan_path, "processed"))
+    }
+
+def _file_stamp():
+    try:
+        stat = os.stat(SCAN_INDEX_FILE)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+def _save_index():
+    """Atomically write the in-memory index to disk"""
+    global _index_stamp
+    with atomic_write(SCAN_INDEX_FILE, 'w') as f:
+        json.dump(_scan_index, f)
+    _index_stamp = _file_stamp()
+    _dirty.clear()
+
+def _load_index():
+    """Return the in-memory index, re-reading it when another process rewrote the file"""
+    global _scan_index, _index_stamp
+    stamp = _file_stamp()
+    if _scan_index is None or (stamp is not None and stamp != _index_stamp):
+        try:
+            with open(SCAN_INDEX_FILE) as f:
+                loaded = json.load(f)
+            # Unsaved upload counters are newer than the file
+            for scan_id in _dirty:
+                if scan_id in _scan_index:
+                    loaded[scan_id] = _scan_index[scan_id]
+            _scan_index = loaded
+            _index_stamp = stamp
+        except (OSError, ValueError):
+            logger.info("Scan index missing or unreadable, rebuilding")
+            rebuild_scan_index()
+    return _scan_index
+
+def rebuild_scan_index():
+    """Rebuild the scan index from the scan folders on disk"""
+    global _scan_index
+    with _index_lock:
+        _scan_index = {}
+        for scan_id in os.listdir(IMAGES_FOLDER):
+            scan_path = os.path.join(IMAGES_FOLDER, scan_id)
+            if os.path.isdir(scan_path) and scan_id.startswith("scan_"):
+                _scan_index[scan_id] = _scan_entry(scan_path)
+        _save_index()
+        return len(_scan_index)
+
+def refresh_scan_index_entry(scan_id):
+    """Re-read a single scan from disk, e.g. after processing or cropping"""
+    scan_path = os.path.join(IMAGES_FOLDER, scan_id)
+    with _index_lock:
+        index = _load_index()
+        if os.path.isdir(scan_path):
+            index[scan_id] = _scan_entry(scan_path)
+        else:
+            index.pop(scan_id, None)
+        _save_index()
+
+def record_image_upload(scan_id, mode, size_bytes, replaced_bytes=None):
+    """Account for an uploaded image without rescanning the folder"""
+    global _save_timer
+    with _index_lock:
+        index = _load_index()
+        entry = index.get(scan_id)
+        if entry is None:
+            refresh_scan_index_entry(scan_id)
+            return
+        if replaced_bytes is None:
+            key = f"{mode}_images"
+            if key in entry:
+                entry[key] += 1
+            replaced_bytes = 0
+        entry['size_bytes'] += size_bytes - replaced_bytes
+        _dirty.add(scan_id)
+        if _save_timer is None:
+            _save_timer = threading.Timer(SCAN_INDEX_SAVE_INTERVAL, flush_scan_index)
+            _save_timer.daemon = True
+            _save_timer.start()
+
+def flush_scan_index():
+    """Write pending upload counters to disk, e.g. when a scan ends"""
+    global _save_timer
+    with _index_lock:
+        if _save_timer is not None:
+            _save_timer.cancel()
+            _save_timer = None
+        if _dirty:
+            _load_index()
+            _save_index()
+
+atexit.register(flush_scan_index)
+
+def latest_scan_id():
+    """Return the newest indexed scan, or None if there are no scans"""
+    with _index_lock:
+        index = _load_index()
+        return max(index) if index else None
+
+def remove_scan_from_index(scan_id):
+    """Drop a deleted scan from the index"""
+    with _index_lock:
+        index = _load_index()
+        if index.pop(scan_id, None) is not None:
+            _save_index()
+
 def create_scan_directory():
     """Create a new directory for a scan with appropriate subdirectories"""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -16,16 +155,17 @@ def create_scan_directory():
     os.makedirs(scan_dir, exist_ok=True)
     os.makedirs(os.path.join(scan_dir, "laser_on"), exist_ok=True)
     os.makedirs(os.path.join(scan_dir, "laser_off"), exist_ok=True)
+    refresh_scan_index_entry(f"scan_{timestamp}")
     return scan_dir
 
 def get_all_scans():
     """Get list of all scans with metadata"""
     scans = []
-    scan_dirs = [d for d in os.listdir(IMAGES_FOLDER) 
-                if os.path.isdir(os.path.join(IMAGES_FOLDER, d)) and d.startswith("scan_")]
+    with _index_lock:
+        index = dict(_load_index())
     
-    for scan_dir in sorted(scan_dirs, reverse=True):
-        scan_path = os.path.join(IMAGES_FOLDER, scan_dir)
+    for scan_dir in sorted(index, reverse=True):
+        entry = index[scan_dir]
         
         # Get timestamp from directory name
         timestamp_str = scan_dir.replace("scan_", "")
@@ -37,21 +177,9 @@ def get_all_scans():
             formatted_date = "Unknown"
             formatted_time = "Unknown"
         
-        # Count images in each subfolder
-        laser_on_count = len([f for f in os.listdir(os.path.join(scan_path, "laser_on")) 
-                            if os.path.isfile(os.path.join(scan_path, "laser_on", f)) 
-                            and f.endswith(('.jpg', '.jpeg', '.png'))])
-        
-        laser_off_count = len([f for f in os.listdir(os.path.join(scan_path, "laser_off")) 
-                            if os.path.isfile(os.path.join(scan_path, "laser_off", f)) 
-                            and f.endswith(('.jpg', '.jpeg', '.png'))])
-        
-        # Get total folder size
-        total_size = 0
-        for dirpath, dirnames, filenames in os.walk(scan_path):
-            for f in filenames:
-                fp = os.path.join(dirpath, f)
-                total_size += os.path.getsize(fp)
+        laser_on_count = entry['laser_on_images']
+        laser_off_count = entry['laser_off_images']
+        total_size = entry['size_bytes']
         
         # Convert size to appropriate unit
         if total_size < 1024:
@@ -61,9 +189,6 @@ def get_all_scans():
         else:
             size_str = f"{total_size / (1024 * 1024):.1f} MB"
         
-        # Check if this scan has been processed
-        processed = os.path.exists(os.path.join(scan_path, "processed"))
-        
         scans.append({
             'id': scan_dir,
             'date': formatted_date,
@@ -72,7 +197,7 @@ def get_all_scans():
             'laser_off_images': laser_off_count,
             'total_images': laser_on_count + laser_off_count,
             'size': size_str,
-            'processed': processed
+            'processed': entry['processed']
         })
     
     return scans
@@ -83,9 +208,15 @@ def delete_scan(scan_id):
         scan_path = os.path.join(IMAGES_FOLDER, scan_id)
         if os.path.exists(scan_path) and scan_id.startswith("scan_"):
             shutil.rmtree(scan_path)
+            remove_scan_from_index(scan_id)
             return {"success": True, "message": f"Deleted scan: {scan_id}"}
         else:
             return {"success": False, "message": "Invalid scan ID"}
     except Exception as e:
         logger.error(f"Error deleting scan: {str(e)}")
-        return {"success": False, "message": f"Error deleting scan: {str(e)}"}
\ No newline at end of file
+        return {"success": False, "message": f"Error deleting scan: {str(e)}"}
+
+if __name__ == '__main__':
+    # Rebuild or repair the scan index: python -m modules.storage
+    logging.basicConfig(level=logging.INFO)
+    print(f"Indexed {rebuild_scan_index()} scans in {SCAN_INDEX_FILE}")
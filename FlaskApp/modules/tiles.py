@@ -0,0 +1,100 @@
+# modules/tiles.py
+import os
+import json
+import time
+import shutil
+import numpy as np
+
+from modules.point_cloud import voxel_keys
+from modules.utils import atomic_write
+
+TILES_DIR = "tiles"
+TILE_INDEX_FILE = "index.json"
+TILE_DTYPE = "<u2"  # xyz quantized to 16 bits within each node's cube
+_QUANT_MAX = 65535
+
+def _split_node(points, lo, size, sample_cells):
+    """Mask of the points this node keeps: the first one in each sample cell"""
+    keys = voxel_keys(points - lo, size / sample_cells)
+    _, first = np.unique(keys, return_index=True)
+    keep = np.zeros(len(points), dtype=bool)
+    keep[first] = True
+    return keep
+
+def _write_tile(path, points, lo, size):
+    quantized = np.rint((points - lo) / size * _QUANT_MAX)
+    np.clip(quantized, 0, _QUANT_MAX, out=quantized)
+    with open(path, 'wb') as f:
+        f.write(quantized.astype(TILE_DTYPE).tobytes())
+
+def build_tiles(points, output_dir, max_tile_points=50000, sample_cells=64, max_depth=10):
+    """Build a level-of-detail octree of quantized binary tiles and return its index"""
+    points = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+    if os.path.isdir(output_dir):
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir)
+
+    index = {
+        "version": f"{time.time_ns():x}",
+        "point_count": len(points),
+        "dtype": TILE_DTYPE,
+        "quantization": _QUANT_MAX,
+        "nodes": {}
+    }
+    if len(points) == 0:
+        index["root"] = None
+        _save_index(output_dir, index)
+        return index
+
+    # Cubic root so quantization steps are equal on every axis
+    lo = points.min(axis=0).astype(np.float64)
+    size = float((points.max(axis=0) - lo).max()) or 1.0
+    index["root"] = "r"
+    stack = [("r", points, lo, size, 0)]
+
+    while stack:
+        name, node_points, node_lo, node_size, level = stack.pop()
+        if len(node_points) <= max_tile_points or level >= max_depth:
+            keep = np.ones(len(node_points), dtype=bool)
+        else:
+            keep = _split_node(node_points, node_lo, node_size, sample_cells)
+
+        _write_tile(os.path.join(output_dir, f"{name}.bin"), node_points[keep], node_lo, node_size)
+        node = {
+            "level": level,
+            "count": int(keep.sum()),
+            "min": node_lo.tolist(),
+            "size": node_size,
+            "children": []
+        }
+        index["nodes"][name] = node
+
+        rest = node_points[~keep]
+        if len(rest) == 0:
+            continue
+        half = node_size / 2
+        octants = ((rest - node_lo) >= half).astype(np.intp)
+        codes = octants[:, 0] * 4 + octants[:, 1] * 2 + octants[:, 2]
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(9))
+        for code in range(8):
+            members = order[bounds[code]:bounds[code + 1]]
+            if len(members) == 0:
+                continue
+            child = f"{name}{code}"
+            child_lo = node_lo + half * np.array([(code >> 2) & 1, (code >> 1) & 1, code & 1])
+            node["children"].append(child)
+            stack.append((child, rest[members], child_lo, half, level + 1))
+
+    _save_index(output_dir, index)
+    return index
+
+def _save_index(output_dir, index):
+    with atomic_write(os.path.join(output_dir, TILE_INDEX_FILE), 'w') as f:
+        json.dump(index, f)
+
+def load_tile(output_dir, index, name):
+    """Decode one tile back to float32 points, e.g. for checks or exports"""
+    node = index["nodes"][name]
+    quantized = np.fromfile(os.path.join(output_dir, f"{name}.bin"), dtype=index["dtype"]).reshape(-1, 3)
+    return (quantized * (node["size"] / index["quantization"]) + np.array(node["min"])).astype(np.float32)
@@ -0,0 +1,117 @@
+# modules/uploads.py
+import os
+import shutil
+import logging
+import tempfile
+import threading
+from flask import Request
+
+from modules.utils import atomic_write
+
+logger = logging.getLogger(__name__)
+
+SCAN_MODES = ("laser_on", "laser_off")
+INCOMING_DIR = ".incoming"
+UPLOAD_ENDPOINT = "/upload-image"
+
+class UploadFile:
+    """Upload body written straight to a temporary file in the scan folder"""
+
+    def __init__(self, directory, keep_data=False):
+        fd, self.name = tempfile.mkstemp(dir=directory, prefix="upload_", suffix=".part")
+        self._file = os.fdopen(fd, "w+b")
+        self.data = bytearray() if keep_data else None
+
+    def write(self, chunk):
+        if self.data is not None:
+            self.data += chunk
+        return self._file.write(chunk)
+
+    def __getattr__(self, name):
+        return getattr(self._file, name)
+
+    def commit(self, path):
+        """Move the finished upload to path and return its size in bytes"""
+        self._file.close()
+        size_bytes = os.path.getsize(self.name)
+        os.replace(self.name, path)
+        return size_bytes
+
+    def discard(self):
+        self._file.close()
+        if os.path.exists(self.name):
+            os.remove(self.name)
+
+class ActiveScan:
+    """Target folders and frame consumers of the scan being captured"""
+
+    def __init__(self, scan_dir, keep_frame_data=True):
+        self.scan_dir = scan_dir
+        self.scan_id = os.path.basename(scan_dir)
+        self.mode_dirs = {mode: os.path.join(scan_dir, mode) for mode in SCAN_MODES}
+        self.incoming_dir = os.path.join(scan_dir, INCOMING_DIR)
+        self.keep_frame_data = keep_frame_data
+        self._consumers = []
+        for directory in list(self.mode_dirs.values()) + [self.incoming_dir]:
+            os.makedirs(directory, exist_ok=True)
+
+    def target_path(self, mode, filename):
+        """Where a frame of this mode is saved, or None for an unknown mode"""
+        directory = self.mode_dirs.get(mode)
+        if directory is None:
+            return None
+        return os.path.join(directory, os.path.basename(filename))
+
+    def add_consumer(self, consumer):
+        self._consumers = self._consumers + [consumer]
+
+    def remove_consumer(self, consumer):
+        self._consumers = [c for c in self._consumers if c is not consumer]
+
+    def wants_frame_data(self):
+        return self.keep_frame_data and any(getattr(c, "wants_frame_data", False) for c in self._consumers)
+
+    def open_upload(self):
+        return UploadFile(self.incoming_dir, keep_data=self.wants_frame_data())
+
+    def write_frame(self, data, path):
+        """Atomically write an encoded frame received in memory and return its size"""
+        with atomic_write(path, tmp_dir=self.incoming_dir) as f:
+            f.write(data)
+        return len(data)
+
+    def publish(self, step, mode, path, data=None):
+        """Hand a saved frame to every consumer"""
+        for consumer in self._consumers:
+            try:
+                wants_data = self.keep_frame_data and getattr(consumer, "wants_frame_data", False)
+                consumer.add_frame(step, mode, path, data if wants_data else None)
+            except Exception as e:
+                logger.error(f"Frame consumer failed for step {step}: {str(e)}")
+
+    def close(self):
+        """Remove uploads that never completed"""
+        shutil.rmtree(self.incoming_dir, ignore_errors=True)
+
+_active_scan = None
+_active_lock = threading.Lock()
+
+def set_active_scan(scan):
+    """Make scan the upload target, closing the previous one"""
+    global _active_scan
+    with _active_lock:
+        previous, _active_scan = _active_scan, scan
+    if previous is not None and previous is not scan:
+        previous.close()
+
+def get_active_scan():
+    return _active_scan
+
+class UploadRequest(Request):
+    """Request class that streams frame uploads into the active scan's folder"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        scan = _active_scan
+        if scan is not None and self.path == UPLOAD_ENDPOINT:
+            return scan.open_upload()
+        return super()._get_file_stream(total_content_length, content_type, filename, content_length)
@@ -5,6 +5,8 @@ import base64
 import logging
 import cv2
 import os
+import tempfile
+from contextlib import contextmanager
 
 logger = logging.getLogger(__name__)
 
@@ -21,4 +23,18 @@ def generate_qr_code(url):
     img = qr.make_image(fill_color="black", back_color="white")
     buffered = BytesIO()
     img.save(buffered)
-    return base64.b64encode(buffered.getvalue()).decode("utf-8")
\ No newline at end of file
+    return base64.b64encode(buffered.getvalue()).decode("utf-8")
+
+@contextmanager
+def atomic_write(path, mode='wb', tmp_dir=None):
+    """Write to a temporary file that replaces path only once the block succeeds"""
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_dir or os.path.dirname(path) or ".",
+                                    prefix=os.path.basename(path) + ".", suffix=".part")
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
@@ -0,0 +1,163 @@
+# simulator/__main__.py
+"""End-to-end scan -> reconstruct benchmark against simulated hardware
+
+Run from the FlaskApp directory:
+
+    python -m simulator --shape vase --handshake --workdir /tmp/scanner-sim
+
+Starts the simulated ESP32, the Flask/Socket.IO app and a headless phone
+in one process, runs a full scan, reconstructs it and reports capture
+throughput, wall times and the error against the ground-truth surface.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import requests
+
+from simulator.esp32_sim import ESP32Simulator
+from simulator.phone_sim import PhoneSimulator
+from simulator.scene import Scene, SHAPES
+
+def _free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait_for_processing(server_url, scan_id, timeout):
+    """Follow the SSE status stream until processing completes or fails"""
+    response = requests.get(f"{server_url}/api/status/{scan_id}", stream=True, timeout=timeout)
+    for line in response.iter_lines(decode_unicode=True):
+        if not line or not line.startswith("data: "):
+            continue
+        update = json.loads(line[len("data: "):])
+        if update.get("status") in ("completed", "error", "cancelled", "finished"):
+            response.close()
+            return update
+    return {"status": "error", "message": "Status stream ended unexpectedly"}
+
+def run(args):
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if args.workdir:
+        os.makedirs(args.workdir, exist_ok=True)
+        os.chdir(args.workdir)
+    sys.path.insert(0, app_dir)
+
+    esp32 = ESP32Simulator(step_latency=args.step_latency).start()
+
+    # Imported after chdir so IMAGES_FOLDER resolves inside the work directory
+    import app as scanner
+    import modules.processing as processing
+    from modules.esp32_controller import controller
+    from modules.point_cloud import load_ply
+
+    controller.host = esp32.address
+    scanner.CAPTURE_HANDSHAKE = args.handshake
+    scanner.TIME_DELAY = args.time_delay
+    scanner.LIVE_RECONSTRUCTION = args.live
+    processing.PROCESSING_WORKERS = args.workers
+    scanner.start_background_threads()
+
+    port = _free_port()
+    server_url = f"http://127.0.0.1:{port}"
+    server = threading.Thread(target=scanner.socketio.run, args=(scanner.app,),
+                              kwargs={"host": "127.0.0.1", "port": port, "debug": False,
+                                      "use_reloader": False, "allow_unsafe_werkzeug": True})
+    server.daemon = True
+    server.start()
+    for _ in range(100):
+        try:
+            requests.get(f"{server_url}/get_scans", timeout=1)
+            break
+        except requests.exceptions.ConnectionError:
+            time.sleep(0.1)
+
+    scene = Scene(args.shape, args.width, args.height)
+    phone = PhoneSimulator(server_url, scene, args.camera_latency, args.jpeg_quality, args.transport).connect()
+
+    # Capture
+    start = time.perf_counter()
+    requests.post(f"{server_url}/start-scan", timeout=10).raise_for_status()
+    # scan_stopped follows every scan, after scan_completed or scan_error
+    if not phone.wait_for("scan_stopped", args.timeout):
+        raise SystemExit("Scan did not complete in time")
+    if phone.events["scan_error"].is_set():
+        raise SystemExit(f"Scan failed: {phone.last_payload['scan_error']['message']}")
+    if not phone.events["scan_completed"].is_set():
+        raise SystemExit("Scan stopped before completing")
+    capture_time = time.perf_counter() - start
+    completed = phone.last_payload.get("scan_completed") or {}
+
+    scan_id = requests.get(f"{server_url}/get_scans", timeout=10).json()["scans"][0]["id"]
+
+    # Reconstruct
+    process_start = time.perf_counter()
+    if args.live:
+        if not phone.wait_for("live_reconstruction_completed", args.timeout):
+            raise SystemExit("Live reconstruction did not finish in time")
+        result = phone.last_payload["live_reconstruction_completed"]
+    else:
+        requests.post(f"{server_url}/process_scan/{scan_id}", timeout=10).raise_for_status()
+        result = _wait_for_processing(server_url, scan_id, args.timeout)
+        if result.get("status") != "completed":
+            raise SystemExit(f"Processing failed: {result.get('message')}")
+    process_time = time.perf_counter() - process_start
+    total_time = time.perf_counter() - start
+
+    points = load_ply(os.path.join(scanner.IMAGES_FOLDER, scan_id, "processed", "reconstructed_model.ply"))
+    phone.disconnect()
+    esp32.stop()
+
+    latencies = sorted(phone.upload_latencies)
+    return {
+        "shape": args.shape,
+        "resolution": [args.width, args.height],
+        "handshake": args.handshake,
+        "live": args.live,
+        "transport": args.transport,
+        "scan_id": scan_id,
+        "frames_uploaded": phone.frames_uploaded,
+        "dropped_frames": completed.get("dropped_frames", []),
+        "capture_seconds": capture_time,
+        "frames_per_second": phone.frames_uploaded / capture_time if capture_time else 0.0,
+        "upload_mbytes_per_second": phone.bytes_uploaded / capture_time / 1e6 if capture_time else 0.0,
+        "upload_latency_p50": latencies[len(latencies) // 2] if latencies else None,
+        "reconstruction_seconds": process_time,
+        "end_to_end_seconds": total_time,
+        "esp32_commands": esp32.commands,
+        "error": scene.reconstruction_error(points)
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulated end-to-end scan benchmark")
+    parser.add_argument("--shape", choices=sorted(SHAPES), default="vase")
+    parser.add_argument("--width", type=int, default=640)
+    parser.add_argument("--height", type=int, default=480)
+    parser.add_argument("--jpeg-quality", type=int, default=95)
+    parser.add_argument("--step-latency", type=float, default=0.01, help="Seconds per simulated motor step")
+    parser.add_argument("--camera-latency", type=float, default=0.0, help="Seconds the phone takes to capture")
+    parser.add_argument("--transport", choices=("http", "socketio"), default="http", help="How the phone sends frames")
+    parser.add_argument("--handshake", action="store_true", help="Use the acknowledgement-driven capture loop")
+    parser.add_argument("--time-delay", type=float, default=0.05, help="TIME_DELAY for the timed capture loop")
+    parser.add_argument("--live", action="store_true", help="Reconstruct during capture")
+    parser.add_argument("--workers", type=int, default=1, help="PROCESSING_WORKERS for batch processing")
+    parser.add_argument("--timeout", type=float, default=1800)
+    parser.add_argument("--workdir", help="Directory to store simulated scans in (default: current directory)")
+    parser.add_argument("--output", help="Also write the report as JSON to this file")
+    args = parser.parse_args()
+
+    if args.output:
+        args.output = os.path.abspath(args.output)
+
+    report = run(args)
+    text = json.dumps(report, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+
+if __name__ == '__main__':
+    main()
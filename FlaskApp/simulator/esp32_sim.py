@@ -0,0 +1,96 @@
+# simulator/esp32_sim.py
+import time
+import argparse
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logger = logging.getLogger(__name__)
+
+class ESP32Simulator:
+    """Local stand-in for the NodeMCU firmware's /esp32/* HTTP routes"""
+
+    def __init__(self, host="127.0.0.1", port=0, step_latency=0.01):
+        self.step_latency = step_latency
+        self.laser_on = False
+        self.position = 0
+        self.commands = {}
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def _step(self, count):
+        for _ in range(count):
+            time.sleep(self.step_latency)
+            with self._lock:
+                self.position = (self.position + 1) % 200
+
+    def _handle(self, path):
+        with self._lock:
+            self.commands[path] = self.commands.get(path, 0) + 1
+
+        if path == "/esp32/status":
+            return "ESP32 is online"
+        if path == "/esp32/laser-on":
+            self.laser_on = True
+            return "Laser ON"
+        if path == "/esp32/laser-off":
+            self.laser_on = False
+            return "Laser OFF"
+        if path == "/esp32/step":
+            self._step(1)
+            return "Step triggered"
+        if path == "/esp32/step360":
+            self._step(200)
+            return "Step triggered"
+        return None
+
+    def _make_handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                body = simulator._handle(self.path)
+                status = 200 if body is not None else 404
+                data = (body or "Not found").encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "text/plain")
+                self.send_header("Content-Length", str(len(data)))
+                self.send_header("Access-Control-Allow-Origin", "*")
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                logger.debug(format % args)
+
+        return Handler
+
+    def start(self):
+        """Serve in a background thread"""
+        self._thread = threading.Thread(target=self.server.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Simulated ESP32 scanner firmware")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--step-latency", type=float, default=0.01, help="Seconds per motor step")
+    args = parser.parse_args()
+
+    simulator = ESP32Simulator(args.host, args.port, args.step_latency)
+    print(f"Simulated ESP32 listening on {simulator.address} (set ESP32_IP to this)")
+    simulator.server.serve_forever()
@@ -0,0 +1,89 @@
+# simulator/phone_sim.py
+import time
+import logging
+import threading
+import requests
+import socketio
+
+from simulator.scene import Scene
+
+logger = logging.getLogger(__name__)
+
+class PhoneSimulator:
+    """Headless phone client that answers capture requests with rendered frames"""
+
+    def __init__(self, server_url, scene=None, camera_latency=0.0, jpeg_quality=95, transport="http"):
+        self.server_url = server_url.rstrip("/")
+        self.scene = scene or Scene()
+        self.camera_latency = camera_latency
+        self.jpeg_quality = jpeg_quality
+        self.transport = transport
+        self.frames_uploaded = 0
+        self.bytes_uploaded = 0
+        self.upload_latencies = []
+        self.events = {}
+
+        self.http = requests.Session()
+        self.sio = socketio.Client()
+        self.sio.on("connect", self._on_connect)
+        self.sio.on("capture_request", self._on_capture_request)
+        for name in ("scan_completed", "scan_error", "scan_stopped", "live_reconstruction_completed"):
+            self.events[name] = threading.Event()
+            self.sio.on(name, self._make_waiter(name))
+        self.last_payload = {}
+
+    def _make_waiter(self, name):
+        def handler(data=None):
+            self.last_payload[name] = data
+            self.events[name].set()
+        return handler
+
+    def _on_connect(self):
+        self.sio.emit("phone_connected")
+
+    def _on_capture_request(self, data):
+        step = data.get("step")
+        mode = data.get("mode")
+        try:
+            if self.camera_latency:
+                time.sleep(self.camera_latency)
+            image = self.scene.encode(int(step), mode, self.jpeg_quality)
+
+            start = time.perf_counter()
+            if self.transport == "socketio":
+                # Acks are handled on the client's read loop, so do not block here
+                self.sio.emit("frame_batch", {"frames": [{"step": step, "mode": mode, "image": image}]},
+                              callback=lambda response: self._on_frame_ack(step, mode, len(image), start, response))
+                return
+            response = self.http.post(f"{self.server_url}/upload-image",
+                                      files={"image": (f"image_{step}.jpg", image, "image/jpeg")},
+                                      data={"step": step, "mode": mode}, timeout=30)
+            response.raise_for_status()
+            self._uploaded(step, mode, len(image), start)
+        except Exception as e:
+            logger.error(f"Simulated capture failed for step {step}: {str(e)}")
+
+    def _on_frame_ack(self, step, mode, size, start, response):
+        result = response["frames"][0]
+        if result.get("success"):
+            self._uploaded(step, mode, size, start)
+        else:
+            logger.error(f"Simulated capture failed for step {step}: {result.get('message')}")
+
+    def _uploaded(self, step, mode, size, start):
+        self.upload_latencies.append(time.perf_counter() - start)
+        self.frames_uploaded += 1
+        self.bytes_uploaded += size
+        self.sio.emit("image_captured", {"step": step, "mode": mode})
+
+    def connect(self):
+        self.sio.connect(self.server_url)
+        return self
+
+    def wait_for(self, name, timeout=None):
+        """Block until a server event has been received"""
+        return self.events[name].wait(timeout)
+
+    def disconnect(self):
+        self.sio.disconnect()
+        self.http.close()
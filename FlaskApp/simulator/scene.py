@@ -0,0 +1,108 @@
+# simulator/scene.py
+import numpy as np
+import cv2
+
+from modules.point_cloud import ANGLE_STEP, STEPS_PER_REVOLUTION, LASER_ANGLE
+
+# Heights are normalized to cylinder_radius * 1.35, as in convert_to_3d
+HEIGHT_FACTOR = 1.35
+
+# The laser-to-camera geometry in convert_to_3d places a point seen at
+# turntable angle theta at azimuth theta + (90 - laser angle) degrees, at
+# a radius of r / sin(laser angle) image pixels
+AZIMUTH_OFFSET = np.pi / 2 - LASER_ANGLE
+RADIUS_GAIN = 1 / np.sin(LASER_ANGLE)
+
+def _cylinder(azimuth, height, cylinder_radius):
+    return np.full(np.broadcast(azimuth, height).shape, 0.3 * cylinder_radius)
+
+def _vase(azimuth, height, cylinder_radius):
+    phase = 3 * np.pi * height / (HEIGHT_FACTOR * cylinder_radius)
+    return np.broadcast_to(cylinder_radius * (0.25 + 0.08 * np.sin(phase)), np.broadcast(azimuth, height).shape)
+
+def _ellipse(azimuth, height, cylinder_radius):
+    a = 0.35 * cylinder_radius
+    b = 0.2 * cylinder_radius
+    radius = a * b / np.sqrt((b * np.cos(azimuth)) ** 2 + (a * np.sin(azimuth)) ** 2)
+    return np.broadcast_to(radius, np.broadcast(azimuth, height).shape)
+
+# Ground-truth surfaces: radius as a function of azimuth and height
+SHAPES = {
+    "cylinder": _cylinder,
+    "vase": _vase,
+    "ellipse": _ellipse
+}
+
+class Scene:
+    """A known object on the turntable and the camera frames it produces"""
+
+    def __init__(self, shape="vase", width=640, height=480, cylinder_radius=1000, line_width=1.2, seed=0):
+        if shape not in SHAPES:
+            raise ValueError(f"Unknown shape: {shape}")
+        self.shape = shape
+        self.radius_fn = SHAPES[shape]
+        self.width = width
+        self.height = height
+        self.cylinder_radius = cylinder_radius
+        self.line_width = line_width
+        self.seed = seed
+        self.scale = cylinder_radius / width
+        self.rows = np.arange(int(height * 0.1), int(height * 0.9))
+
+    def _row_heights(self, rows):
+        return (self.height - rows) / self.height * (self.cylinder_radius * HEIGHT_FACTOR)
+
+    def laser_columns(self, position):
+        """Sub-pixel laser column for every object row at a turntable position"""
+        theta = np.radians(position * ANGLE_STEP)
+        radius = self.radius_fn(theta + AZIMUTH_OFFSET, self._row_heights(self.rows), self.cylinder_radius)
+        r = radius / (RADIUS_GAIN * self.scale)
+        return self.width / 2 - r
+
+    def render(self, step, mode):
+        """Render the BGR frame the phone would capture for a step and mode"""
+        position = step % STEPS_PER_REVOLUTION
+
+        # Static background, identical for the laser-on and laser-off frames of a position
+        rng = np.random.default_rng(self.seed * STEPS_PER_REVOLUTION + position)
+        frame = rng.integers(10, 60, (self.height, self.width, 3), dtype=np.uint8)
+
+        if mode == "laser_on":
+            cols = np.arange(self.width, dtype=np.float32)
+            centers = self.laser_columns(position).astype(np.float32)
+            profile = np.exp(-((cols[None, :] - centers[:, None]) ** 2) / (2 * self.line_width ** 2))
+            line = frame[self.rows].astype(np.float32)
+            line += profile[:, :, None] * np.array([60, 60, 255], dtype=np.float32)
+            frame[self.rows] = np.clip(line, 0, 255).astype(np.uint8)
+
+        return frame
+
+    def encode(self, step, mode, quality=95):
+        """Render a frame and encode it as JPEG bytes"""
+        ok, buffer = cv2.imencode(".jpg", self.render(step, mode), [cv2.IMWRITE_JPEG_QUALITY, quality])
+        if not ok:
+            raise RuntimeError("JPEG encoding failed")
+        return buffer.tobytes()
+
+    def reconstruction_error(self, points):
+        """Radial distance of reconstructed points from the ground-truth surface"""
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 3)
+        heights = self._row_heights(self.rows)
+        in_span = (points[:, 1] >= heights.min()) & (points[:, 1] <= heights.max())
+        surface = points[in_span]
+
+        azimuth = np.arctan2(surface[:, 2], surface[:, 0])
+        radius = np.hypot(surface[:, 0], surface[:, 2])
+        expected = self.radius_fn(azimuth, surface[:, 1], self.cylinder_radius)
+        error = np.abs(radius - expected)
+
+        if len(error) == 0:
+            return {"points": len(points), "outside_object": int((~in_span).sum())}
+        return {
+            "points": len(points),
+            "outside_object": int((~in_span).sum()),
+            "mean_abs_error": float(error.mean()),
+            "rms_error": float(np.sqrt((error ** 2).mean())),
+            "max_error": float(error.max()),
+            "relative_rms_error": float(np.sqrt((error ** 2).mean()) / expected.mean())
+        }
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from modules.image_processor import extract_laser_points
+
+def _line_image(centers, sigma=1.5, peak=200.0, background=10.0, width=160):
+    """Rows with one Gaussian laser profile each, like a blurred difference frame"""
+    cols = np.arange(width, dtype=np.float64)
+    rows = [background + peak * np.exp(-(cols - center) ** 2 / (2 * sigma ** 2)) for center in centers]
+    return np.rint(rows).astype(np.uint8)
+
+@pytest.mark.parametrize("subpixel", ["centroid", "parabolic"])
+@pytest.mark.parametrize("sigma", [1.0, 1.5, 2.0])
+def test_subpixel_peaks_match_known_positions(subpixel, sigma):
+    centers = [40.0, 73.3, 73.7, 101.15, 120.5]
+    points = extract_laser_points(_line_image(centers, sigma), subpixel=subpixel)
+    np.testing.assert_allclose(points[:, 0], centers, atol=0.05)
+    np.testing.assert_array_equal(points[:, 1], np.arange(len(centers)))
+
+def test_centroid_keeps_peaks_on_the_image_border():
+    image = _line_image([0.0, 159.0])
+    points = extract_laser_points(image, subpixel="centroid")
+    np.testing.assert_array_equal(points[:, 0], [0.0, 159.0])
+
+def test_integer_peaks_without_subpixel():
+    points = extract_laser_points(_line_image([20.0, 73.3]))
+    np.testing.assert_array_equal(points, [[20, 0], [73, 1]])
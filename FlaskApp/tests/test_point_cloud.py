@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from modules.point_cloud import PlyWriter, load_ply, save_ply
+
+@pytest.mark.parametrize("fmt", ["binary_little_endian", "ascii"])
+def test_ply_round_trip(tmp_path, fmt):
+    points = np.random.default_rng(0).normal(size=(1234, 3)).astype(np.float32)
+    path = str(tmp_path / "cloud.ply")
+    save_ply(points, path, fmt)
+    np.testing.assert_allclose(load_ply(path), points, rtol=1e-6)
+
+def test_ply_vertex_count_is_not_zero_padded(tmp_path):
+    path = str(tmp_path / "cloud.ply")
+    with PlyWriter(path) as writer:
+        writer.write(np.zeros((5, 3), dtype=np.float32))
+        writer.flush()
+        writer.write(np.ones((1229, 3), dtype=np.float32))
+    with open(path, 'rb') as f:
+        header = f.read().split(b"end_header\n")[0].decode().splitlines()
+    vertex_line = next(line for line in header if line.startswith("element vertex"))
+    assert vertex_line.split() == ["element", "vertex", "1234"]
+    assert len(load_ply(path)) == 1234
@@ -0,0 +1,133 @@
+# worker/__main__.py
+"""Out-of-process scan processing worker
+
+Run from the FlaskApp directory, next to a web process configured with
+PROCESSING_BACKEND = "worker":
+
+    python -m worker
+
+Takes jobs from the SQLite queue in JOB_QUEUE_FILE one at a time and
+writes their status events back to it for the web process to stream.
+Start several workers to process several scans at once. A worker that is
+stopped or crashes loses nothing: its job's lease expires and the next
+worker resumes it from the point store.
+"""
+import os
+import time
+import socket
+import logging
+import argparse
+import threading
+
+from modules.job_queue import JobQueue
+from modules.processing import process_scan_images
+from modules.metrics import global_metrics
+from config import JOB_QUEUE_FILE, WORKER_POLL_INTERVAL, WORKER_LEASE_SECONDS, WORKER_MAX_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+class QueueStatus:
+    """Status queue for process_scan_images that writes events to the job queue"""
+
+    def __init__(self, job_queue, job_id, worker_id, cancel_event):
+        self.job_queue = job_queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.cancel_event = cancel_event
+        self.latest = None
+        self.lost = threading.Event()
+
+    def put(self, event):
+        # Only the worker holding the job may write its events
+        if self.lost.is_set():
+            return
+        if not self.job_queue.add_event(self.job_id, event, self.worker_id):
+            self.lease_lost()
+            return
+        if event.get("status") != "metrics":
+            self.latest = event
+
+    def lease_lost(self):
+        if not self.lost.is_set():
+            logger.warning(f"Lost the lease of job {self.job_id}, stopping")
+        self.lost.set()
+        self.cancel_event.set()
+
+    def flush_metrics(self):
+        """Forward stage timings recorded in this process to the web process's /metrics"""
+        drained = global_metrics.drain()
+        if drained["stages"] or drained["counters"]:
+            self.put({"status": "metrics", "metrics": drained})
+
+def run_job(job_queue, job, worker_id, lease_seconds):
+    """Process one claimed job, renewing its lease until it finishes or is reclaimed"""
+    cancel_event = threading.Event()
+    stop = threading.Event()
+    status = QueueStatus(job_queue, job["id"], worker_id, cancel_event)
+
+    def renew_lease():
+        while not stop.wait(lease_seconds / 3):
+            try:
+                if not job_queue.renew(job["id"], worker_id, lease_seconds):
+                    status.lease_lost()
+                    return
+                if job_queue.cancel_requested(job["id"]):
+                    cancel_event.set()
+                status.flush_metrics()
+            except Exception as e:
+                logger.error(f"Could not renew the lease of job {job['id']}: {str(e)}")
+
+    heartbeat = threading.Thread(target=renew_lease, daemon=True)
+    heartbeat.start()
+
+    logger.info(f"Processing {job['scan_id']} (job {job['id']}, attempt {job['attempts']})")
+    start = time.time()
+    cpu_start = time.process_time()
+    try:
+        process_scan_images(job["scan_id"], status, cancel_event)
+    finally:
+        stop.set()
+        heartbeat.join()
+    status.flush_metrics()
+
+    # Another worker owns the job now and will finish it
+    if status.lost.is_set():
+        return
+
+    last_status = status.latest.get("status") if status.latest else None
+    state = {"cancelled": "cancelled", "error": "failed"}.get(last_status, "completed")
+    finished = job_queue.finish(job["id"], state, {
+        "wait_seconds": round(job["started_at"] - job["submitted_at"], 3),
+        "run_seconds": round(time.time() - start, 3),
+        "cpu_seconds": round(time.process_time() - cpu_start, 3),
+        "attempts": job["attempts"]
+    }, worker_id)
+    if finished:
+        logger.info(f"Job {job['id']} {state}")
+    else:
+        logger.warning(f"Job {job['id']} was reclaimed before it finished here")
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan processing worker")
+    parser.add_argument("--queue", default=JOB_QUEUE_FILE, help="SQLite job queue file")
+    parser.add_argument("--poll", type=float, default=WORKER_POLL_INTERVAL, help="Seconds between polls of an empty queue")
+    parser.add_argument("--lease", type=float, default=WORKER_LEASE_SECONDS, help="Seconds a claimed job stays leased without renewal")
+    parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    job_queue = JobQueue(args.queue, WORKER_MAX_ATTEMPTS)
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    logger.info(f"Worker {worker_id} waiting for jobs in {args.queue}")
+
+    while True:
+        job = job_queue.claim(worker_id, args.lease)
+        if job is None:
+            if args.once:
+                return
+            time.sleep(args.poll)
+            continue
+        run_job(job_queue, job, worker_id, args.lease)
+
+if __name__ == '__main__':
+    main()